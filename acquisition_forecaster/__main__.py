@@ -0,0 +1,88 @@
+import argparse
+import importlib
+import sys
+
+# Single entry point, python -m acquisition_forecaster <command>. Commands import their module when they run, so a
+# short query only pays for its own dependencies (pandas, geopandas, skyfield, matplotlib are each a large share of
+# the start-up); `benchmark startup` checks these costs against a budget
+
+
+def plans(args):
+    from acquisition_forecaster import plan_parser
+    if args.sites:
+        print(plan_parser.match_project_sites(args.project, args.sites, args.predicate, cache=not args.no_cache,
+                                              workers=args.workers))
+    else:
+        print(plan_parser.main(args.project, pushdown=not args.no_pushdown, cache=not args.no_cache,
+                               workers=args.workers))
+
+
+def passes(args):
+    from acquisition_forecaster import pass_forecaster
+    pass_forecaster.report_passes(args.project, args.network, args.workers, args.adaptive)
+
+
+def acquire(args):
+    from acquisition_forecaster import historical_analysis
+    historical_analysis.acquire(args.project, historical_analysis.open_catalog(args.catalog), args.workers,
+                                incremental=not args.full)
+
+
+def plot(args):
+    from acquisition_forecaster import historical_analysis
+    historical_analysis.plot(args.project)
+
+
+def stats(args):
+    from acquisition_forecaster import historical_analysis
+    historical_analysis.stats(args.project, args.window)
+
+
+def catalog(args):
+    from acquisition_forecaster import local_catalog
+    print(f"Wrote {local_catalog.write_project_catalog(args.project, args.output)} items to {args.output}")
+
+
+def opportunities(args):
+    from acquisition_forecaster import opportunity_planner
+    table = opportunity_planner.main(args.projects, args.workers, not args.fixed_step, args.output)
+    print(table[table["rank"] <= args.top].to_string(index=False))
+
+
+# Command: (function, module adding its options, options of add_arguments, help). A command's module is only
+# imported to parse its own options, which the command imports anyway to run
+COMMANDS = {
+    "plans": (plans, "plan_parser", {}, "Acquisition plan swaths over the project's point (or --sites) and dates"),
+    "passes": (passes, "pass_forecaster", {}, "Satellite passes over the project's point, or its station network"),
+    "acquire": (acquire, "historical_analysis", {"actions": ["acquire"]},
+                "Fetch the past Sentinel-2 acquisitions over the project's point"),
+    "plot": (plot, "historical_analysis", {"actions": ["plot"]}, "Plot the revisit gaps of the acquired history"),
+    "stats": (stats, "historical_analysis", {"actions": ["stats"]}, "Revisit statistics of the acquired history"),
+    "opportunities": (opportunities, "opportunity_planner", {},
+                      "Ranked upcoming capture opportunities of every project site, from the acquisition plans, TLE"
+                      " passes and acquisition history of all projects"),
+    "catalog": (catalog, "local_catalog", {}, "Write a synthetic STAC catalogue for the project, to acquire offline"),
+}
+
+
+def build_parser(command=None):
+    # Every command is listed, with the options of `command` only
+    parser = argparse.ArgumentParser(prog="python -m acquisition_forecaster",
+                                     description="Sentinel-2 acquisition plans, pass forecasts and revisit history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (func, module, options, help) in COMMANDS.items():
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        if name == command:
+            importlib.import_module(f"acquisition_forecaster.{module}").add_arguments(sub, **options)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser(next((arg for arg in argv if not arg.startswith("-")), None)).parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
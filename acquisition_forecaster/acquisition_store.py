@@ -0,0 +1,102 @@
+from datetime import date, datetime, timedelta, timezone
+import json
+import os
+
+import pandas as pd
+
+# Append-only store of fetched STAC item metadata (id, satellite, datetime), one Parquet file per month, plus
+# the list of day ranges already queried so reruns only ask the catalogue for what is missing
+STORE_SETTLE_DAYS = 2  # the most recent days may still get items ingested, they are queried again next run
+ITEM_COLUMNS = ["id", "satellite", "datetime"]
+
+
+def store_dir(project):
+    return f"acquisition_forecaster/projects/{project}/output/items"
+
+
+def load_coverage(store):
+    # Queried ranges as sorted, non-overlapping [start, end) date pairs
+    path = os.path.join(store, "coverage.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in json.load(f)]
+
+
+def add_coverage(store, start, end):
+    merged = []
+    for s, e in sorted(load_coverage(store) + [(start, end)]):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+
+    def write(path):
+        with open(path, "w") as f:
+            json.dump([[s.isoformat(), e.isoformat()] for s, e in merged], f)
+
+    os.makedirs(store, exist_ok=True)
+    write_atomic(os.path.join(store, "coverage.json"), write)
+
+
+def missing_ranges(coverage, start, end):
+    # Parts of [start, end) not covered yet
+    missing = []
+    cursor = start
+    for s, e in coverage:
+        if e <= cursor:
+            continue
+        if s >= end:
+            break
+        if s > cursor:
+            missing.append((cursor, s))
+        cursor = max(cursor, e)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def settled_until():
+    return (datetime.now(timezone.utc) - timedelta(days=STORE_SETTLE_DAYS)).date()
+
+
+def partition_path(store, month):
+    return os.path.join(store, f"{month}.parquet")
+
+
+def write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def append_items(store, records):
+    # Merge new records into their monthly partitions; an item already stored is kept once
+    if records.empty:
+        return
+    os.makedirs(store, exist_ok=True)
+    months = records["datetime"].dt.strftime("%Y-%m")
+    for month, new in records.groupby(months):
+        path = partition_path(store, month)
+        if os.path.exists(path):
+            new = pd.concat([pd.read_parquet(path), new], ignore_index=True)
+        new = new.drop_duplicates("id").sort_values("datetime", ignore_index=True)
+        write_atomic(path, new.to_parquet)
+
+
+def read_items(store, start, end):
+    # Stored records with start <= date < end, reading only the overlapping partitions
+    frames = []
+    month = date(start.year, start.month, 1)
+    while month < end:
+        path = partition_path(store, f"{month:%Y-%m}")
+        if os.path.exists(path):
+            frames.append(pd.read_parquet(path))
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+    if not frames:
+        return pd.DataFrame({"id": pd.Series(dtype=str), "satellite": pd.Series(dtype=str),
+                             "datetime": pd.Series(dtype="datetime64[us, UTC]")})
+    records = pd.concat(frames, ignore_index=True)
+    day = records["datetime"].dt.date
+    return records[(day >= start) & (day < end)].reset_index(drop=True)
@@ -0,0 +1,498 @@
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from acquisition_forecaster import (acquisition_store, historical_analysis, local_catalog, opportunity_planner,
+                                    pass_forecaster, plan_parser, revisit_analysis)
+
+
+def measure(func, *args, repeat=3):
+    # Best wall time over `repeat` runs and the peak traced memory of one extra run
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 2**20
+
+
+def report(label, seconds, peak_mb, baseline=None):
+    speedup = f"  x{baseline / seconds:.1f}" if baseline else ""
+    print(f"  {label:<24} {seconds * 1000:9.1f} ms  {peak_mb:8.1f} MB peak{speedup}")
+
+
+def legacy_parse_plans(kmls):
+    # Previous plan_parser path: whole-tree ET.parse and a GeoDataFrame rebuilt after every file
+    rows = []
+    gdf = None
+    for kml in kmls:
+        satellite = kml.split("/")[-1].split("_")[0]
+        root = ET.parse(kml).getroot()
+        for pm in root.findall(".//kml:Placemark", plan_parser.NS):
+            row = plan_parser.parse_placemark(pm, satellite)
+            if row is not None:
+                row["capture_start"] = pd.to_datetime(row["capture_start"])
+                row["capture_end"] = pd.to_datetime(row["capture_end"])
+                rows.append(row)
+        gdf = gpd.GeoDataFrame(rows, geometry="polygon", crs="EPSG:4326")
+    return gdf
+
+
+def bench_plan_parser(project, repeat, copies):
+    # Replicate the plan set to emulate a season's worth of KMLs
+    kmls = sorted(glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml")) * copies
+    print(f"plan_parser on {len(kmls)} KML files ({project}, x{copies})")
+
+    legacy_s, legacy_mb = measure(legacy_parse_plans, kmls, repeat=repeat)
+    report("ET.parse + rebuild", legacy_s, legacy_mb)
+    stream_s, stream_mb = measure(plan_parser.parse_plans, kmls, repeat=repeat)
+    report("iterparse streaming", stream_s, stream_mb, baseline=legacy_s)
+
+
+def filter_after_scan(kmls, pt, start_date, end_date):
+    gdf = plan_parser.parse_plans(kmls)
+    gdf = gdf[gdf.geometry.apply(lambda geom: geom.contains(pt)).astype(bool)]
+    return gdf[(gdf["capture_start"] >= start_date) & (gdf["capture_end"] < end_date)]
+
+
+def bench_pushdown(project, repeat, copies):
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    pt = Point(config["POINT"][0], config["POINT"][1])
+    start_date = pd.to_datetime(config["START_DATE"])
+    end_date = pd.to_datetime(config["END_DATE"]) + pd.Timedelta(days=1)
+    kmls = sorted(glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml")) * copies
+    print(f"plan_parser filters on {len(kmls)} KML files ({project}, x{copies})")
+
+    after_s, after_mb = measure(filter_after_scan, kmls, pt, start_date, end_date, repeat=repeat)
+    report("filter after scan", after_s, after_mb)
+    pushdown_s, pushdown_mb = measure(plan_parser.parse_plans, kmls, pt, start_date.isoformat(),
+                                      end_date.isoformat(), repeat=repeat)
+    report("filter pushdown", pushdown_s, pushdown_mb, baseline=after_s)
+
+
+def per_site_apply(gdf, sites):
+    # One Python-level containment pass over every polygon per site, as plan_parser.main does for its POINT
+    return [gdf[gdf.geometry.apply(lambda geom: geom.contains(pt)).astype(bool)] for pt in sites.geometry]
+
+
+def bench_sites(project, repeat, max_sites, naive_max_sites):
+    kmls = sorted(glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml"))
+    gdf = plan_parser.parse_plans(kmls)
+    print(f"site matching against {len(gdf)} swaths ({project})")
+
+    # Random stations over the swaths' extent, reproducible across runs
+    rng = np.random.default_rng(0)
+    minx, miny, maxx, maxy = gdf.total_bounds
+    n_sites = 1
+    while n_sites <= max_sites:
+        lons = rng.uniform(minx, maxx, n_sites)
+        lats = rng.uniform(miny, maxy, n_sites)
+        sites = plan_parser.load_sites(list(zip(lons, lats)))
+
+        print(f" {n_sites} sites")
+        baseline = None
+        if n_sites <= naive_max_sites:
+            baseline, naive_mb = measure(per_site_apply, gdf, sites, repeat=repeat)
+            report("per-site apply", baseline, naive_mb)
+        indexed_s, indexed_mb = measure(plan_parser.match_sites, gdf, sites, repeat=repeat)
+        report("sindex match table", indexed_s, indexed_mb, baseline=baseline)
+        n_sites *= 10
+
+
+def bench_cache(project, repeat):
+    kmls = sorted(glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml"))
+    print(f"plan cache on {len(kmls)} KML files ({project})")
+
+    parse_s, parse_mb = measure(plan_parser.parse_plans, kmls, repeat=repeat)
+    report("parse KMLs", parse_s, parse_mb)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        plan_parser.load_plans(kmls, cache_dir)  # warm up
+        cached_s, cached_mb = measure(plan_parser.load_plans, kmls, cache_dir, repeat=repeat)
+        report("load from cache", cached_s, cached_mb, baseline=parse_s)
+
+
+def bench_workers(project, repeat, copies, max_workers):
+    kmls = sorted(glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml")) * copies
+    print(f"plan_parser workers on {len(kmls)} KML files ({project}, x{copies}, {os.cpu_count()} CPUs)")
+
+    # Memory is only traced in the parent process, so only wall time is meaningful here
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        seconds, peak_mb = measure(plan_parser.parse_plans, kmls, None, None, None, workers, repeat=repeat)
+        report(f"{workers} worker(s)", seconds, peak_mb, baseline=baseline)
+        baseline = baseline or seconds
+        workers *= 2
+
+
+def bench_passes(projects, repeat):
+    for project in projects:
+        ts, sat, observer, start_utc, end_utc = pass_forecaster.load_project(project)
+        print(f"pass_forecaster on {project} ({start_utc.date()} to {end_utc.date()})")
+
+        loop_s, loop_mb = measure(pass_forecaster.step_passes, ts, sat, observer, start_utc, end_utc, repeat=repeat)
+        report("scalar step loop", loop_s, loop_mb)
+        vec_s, vec_mb = measure(pass_forecaster.find_passes, ts, sat, observer, start_utc, end_utc, repeat=repeat)
+        report("vectorized + bisection", vec_s, vec_mb, baseline=loop_s)
+
+        # The loop interpolates linearly between samples, so it is the less accurate of the two
+        loop = pass_forecaster.step_passes(ts, sat, observer, start_utc, end_utc)
+        vec = pass_forecaster.find_passes(ts, sat, observer, start_utc, end_utc)
+        if len(loop) != len(vec):
+            print(f"  pass count differs: {len(loop)} (loop) vs {len(vec)} (vectorized)")
+            continue
+        deltas = [abs((a - b).total_seconds()) for (a_aos, a_los), (b_aos, _, b_los, _) in zip(loop, vec)
+                  for a, b in ((a_aos, b_aos), (a_los, b_los))]
+        print(f"  {len(vec)} passes, max AOS/LOS difference {max(deltas, default=0):.3f} s")
+
+
+def bench_adaptive(projects, repeat, days, tolerance_s=1e-3):
+    for project in projects:
+        ts, sat, observer, start_utc, _ = pass_forecaster.load_project(project)
+        end_utc = start_utc + timedelta(days=days)
+        print(f"adaptive pass search on {project} ({days} days from {start_utc.date()})")
+
+        fixed_s, fixed_mb = measure(pass_forecaster.find_passes, ts, sat, observer, start_utc, end_utc, repeat=repeat)
+        report("fixed step", fixed_s, fixed_mb)
+        adaptive_s, adaptive_mb = measure(pass_forecaster.find_passes, ts, sat, observer, start_utc, end_utc,
+                                          pass_forecaster.STEP_SECONDS, pass_forecaster.CHUNK_SAMPLES, True,
+                                          repeat=repeat)
+        report("adaptive screening", adaptive_s, adaptive_mb, baseline=fixed_s)
+
+        fixed = pass_forecaster.find_passes(ts, sat, observer, start_utc, end_utc)
+        adaptive = pass_forecaster.find_passes(ts, sat, observer, start_utc, end_utc, adaptive=True)
+        if len(fixed) != len(adaptive):
+            print(f"  pass count differs: {len(fixed)} (fixed) vs {len(adaptive)} (adaptive)")
+            continue
+        deltas = [abs((a - b).total_seconds()) for pf, pa in zip(fixed, adaptive) for a, b in zip(pf[:3], pa[:3])]
+        worst = max(deltas, default=0)
+        status = "OK" if worst <= tolerance_s else "ABOVE TOLERANCE"
+        print(f"  {len(fixed)} passes, max AOS/TCA/LOS difference {worst:.6f} s "
+              f"(tolerance {tolerance_s} s): {status}")
+
+
+def synthetic_catalogue(tle, n_satellites):
+    # Spread copies of one TLE over the orbit plane (RAAN) and along the orbit (mean anomaly)
+    name, line1, line2 = tle
+    catalogue = []
+    for i in range(n_satellites):
+        raan = (float(line2[17:25]) + 360.0 * i / n_satellites) % 360
+        anomaly = (float(line2[43:51]) + 137.5 * i) % 360
+        catalogue.append((f"{name}-{i}", line1, f"{line2[:17]}{raan:8.4f}{line2[25:43]}{anomaly:8.4f}{line2[51:]}"))
+    return catalogue
+
+
+def bench_network(project, repeat, n_satellites, n_stations, workers):
+    tle = pass_forecaster.load_tle_catalogue(f"acquisition_forecaster/projects/{project}/input/tle")[0]
+    catalogue = synthetic_catalogue(tle, n_satellites)
+    _, _, _, start_utc, end_utc = pass_forecaster.load_project(project)
+
+    # Random stations, reproducible across runs
+    rng = np.random.default_rng(0)
+    stations = {f"ST{i:03d}": (rng.uniform(-180, 180), rng.uniform(-80, 80)) for i in range(n_stations)}
+    print(f"pass network: {n_satellites} satellites x {n_stations} stations, {start_utc.date()} to "
+          f"{end_utc.date()}, {workers} worker(s)")
+
+    seconds, peak_mb = measure(pass_forecaster.forecast_network, catalogue, stations, start_utc, end_utc, workers,
+                               repeat=repeat)
+    n_passes = len(pass_forecaster.forecast_network(catalogue, stations, start_utc, end_utc, workers))
+    report(f"{n_passes} passes", seconds, peak_mb)
+
+
+def bench_stac(project, repeat, years, latency, workers):
+    # Offline: a synthetic catalogue behind a LocalCatalog that sleeps `latency` per search like a remote API
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    pt = Point(config["POINT"][0], config["POINT"][1])
+    start_date = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
+    end_date = start_date.replace(year=start_date.year + years)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.ndjson")
+        n_items = local_catalog.write_synthetic_catalog(path, pt.__geo_interface__, start_date, end_date)
+        catalog = local_catalog.LocalCatalog(path, latency=latency)
+        n_chunks = len(list(historical_analysis.date_chunks(start_date, end_date)))
+        print(f"STAC acquisition: {n_items} items, {n_chunks} chunks, {latency * 1000:.0f} ms per query")
+
+        def pipeline(n_workers):
+            return historical_analysis.build_dataframe(
+                historical_analysis.fetch_items(catalog, pt, start_date, end_date, n_workers))
+
+        baseline = None
+        for n_workers in sorted({1, workers}):
+            seconds, peak_mb = measure(pipeline, n_workers, repeat=repeat)
+            report(f"{n_workers} worker(s), {n_items / seconds:.0f} items/s", seconds, peak_mb, baseline=baseline)
+            baseline = baseline or seconds
+
+
+def bench_store(project, repeat, years, latency, workers):
+    # Nightly refresh of a multi-year history: full re-download versus a store that only fetches the new day
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    pt = Point(config["POINT"][0], config["POINT"][1])
+    end_date = min(datetime.strptime(config["END_DATE"], "%Y-%m-%d"),
+                   datetime.combine(acquisition_store.settled_until(), datetime.min.time()) - timedelta(days=1))
+    start_date = end_date.replace(year=end_date.year - years)
+    refreshed_end = end_date + timedelta(days=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.ndjson")
+        local_catalog.write_synthetic_catalog(path, pt.__geo_interface__, start_date, refreshed_end + timedelta(days=1))
+        catalog = local_catalog.LocalCatalog(path, latency=latency)
+        print(f"acquisition store: {years} years to {end_date.date()}, refreshed to {refreshed_end.date()}, "
+              f"{latency * 1000:.0f} ms per query")
+
+        def full_refresh():
+            items = historical_analysis.fetch_items(catalog, pt, start_date, refreshed_end, workers)
+            return historical_analysis.build_dataframe(items)
+
+        store = os.path.join(tmp, "store")
+        previous = revisit_analysis.revisit_table(
+            historical_analysis.fetch_incremental(store, catalog, pt, start_date, end_date, workers))
+
+        def incremental_refresh():
+            records = historical_analysis.fetch_incremental(store, catalog, pt, start_date, refreshed_end, workers)
+            return historical_analysis.extend_revisit_table(previous, records)
+
+        full_s, full_mb = measure(full_refresh, repeat=repeat)
+        report("full re-download", full_s, full_mb)
+        incremental_s, incremental_mb = measure(incremental_refresh, repeat=repeat)
+        report("store + delta fetch", incremental_s, incremental_mb, baseline=full_s)
+
+
+def legacy_revisit_table(records):
+    # Previous historical_analysis table: object columns filled by a loop over hard-coded satellites
+    df = pd.DataFrame({
+        'satellite': records['satellite'].astype(object),
+        'datetime': records['datetime'],
+        'day_of_week': records['datetime'].dt.day_name(),
+        'hour': records['datetime'].dt.hour + records['datetime'].dt.minute / 60,
+    })
+    df = df.sort_values(by='datetime')
+    df['days_since_last'] = df['datetime'].diff().dt.total_seconds() / (3600 * 24)
+    df['days_since_last_s2a'] = None
+    df['days_since_last_s2b'] = None
+    df['days_since_last_s2c'] = None
+    for sat in ['S2A', 'S2B', 'S2C']:
+        mask = df['satellite'] == sat
+        diffs = df.loc[mask, 'datetime'].diff().dt.total_seconds() / (3600 * 24)
+        df.loc[mask, f'days_since_last_{sat.lower()}'] = diffs
+    return df
+
+
+def synthetic_records(n_items, n_sites, years, seed=0):
+    # Acquisition records spread over `n_sites` sites and `years` years, satellites drawn from S2A/S2B/S2C
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2020-01-01", tz="UTC")
+    offsets = rng.integers(0, years * 365 * 86400, n_items)
+    return pd.DataFrame({
+        "site": rng.integers(0, n_sites, n_items).astype("int32"),
+        "satellite": rng.choice(["S2A", "S2B", "S2C"], n_items),
+        "datetime": start + pd.to_timedelta(offsets, unit="s"),
+    })
+
+
+def bench_revisit(repeat, n_items, n_sites, years, naive_max_sites):
+    records = synthetic_records(n_items, n_sites, years)
+    print(f"revisit analysis: {n_items} items, {n_sites} sites, {years} years")
+
+    baseline = None
+    if n_sites <= naive_max_sites:
+        def per_site_loop():
+            return [legacy_revisit_table(group) for _, group in records.groupby("site")]
+
+        baseline, peak_mb = measure(per_site_loop, repeat=repeat)
+        report("per-site object loop", baseline, peak_mb)
+        legacy_bytes = sum(table.memory_usage(deep=True).sum() for table in per_site_loop())
+        print(f"  {'':<24} {legacy_bytes / n_items:9.0f} bytes per item")
+
+    seconds, peak_mb = measure(revisit_analysis.revisit_table, records, "site", repeat=repeat)
+    report("grouped diff", seconds, peak_mb, baseline=baseline)
+    table = revisit_analysis.revisit_table(records, by="site")
+    print(f"  {'':<24} {table.memory_usage(deep=True).sum() / n_items:9.0f} bytes per item")
+    seconds, peak_mb = measure(revisit_analysis.revisit_stats, table, "site", repeat=repeat)
+    report("percentile stats", seconds, peak_mb)
+
+
+def per_site_planning(sites, kmls, catalogue, history):
+    # Baseline: the three tools run for one site after another, as separate project runs would
+    from skyfield.api import EarthSatellite, wgs84
+
+    found = 0
+    for site in sites.itertuples():
+        plans = plan_parser.filter_plans(plan_parser.load_plans(kmls), Point(site.lon, site.lat), site.start, site.end)
+        ts = pass_forecaster.timescale()
+        observer = wgs84.latlon(site.lat, site.lon, 0.0)
+        passes = [pass_forecaster.find_passes(ts, EarthSatellite(line1, line2, name, ts), observer,
+                                              site.start.to_pydatetime(), site.end.to_pydatetime(), adaptive=True)
+                  for name, line1, line2 in catalogue]
+        revisit_analysis.revisit_stats(revisit_analysis.revisit_table(history))
+        found += len(plans) + sum(map(len, passes))
+    return found
+
+
+def bench_planner(project, history_project, repeat, n_sites, naive_max_sites, n_satellites):
+    # Random sites around the project's point sharing its plans, a synthetic catalogue and another project's history
+    kmls, catalogues, _ = opportunity_planner.project_inputs([project])
+    _, _, histories = opportunity_planner.project_inputs([history_project])
+    catalogue = synthetic_catalogue(catalogues[project][0], n_satellites)
+    point = opportunity_planner.project_sites([project]).iloc[0]
+    print(f"opportunity planner: {len(kmls)} plan files, {n_satellites} satellites, history of {history_project}")
+
+    rng = np.random.default_rng(0)
+    baseline_per_site = None
+    for count in sorted({min(naive_max_sites, n_sites), n_sites}):
+        sites = pd.DataFrame({"site": [f"S{i:04d}" for i in range(count)], "project": "bench",
+                              "lon": point["lon"] + rng.uniform(-1, 1, count),
+                              "lat": point["lat"] + rng.uniform(-1, 1, count),
+                              "start": point["start"], "end": point["end"]})
+        print(f" {count} sites")
+        baseline = None
+        if count <= naive_max_sites:
+            baseline, peak_mb = measure(per_site_planning, sites, kmls, catalogue, histories[history_project],
+                                        repeat=repeat)
+            report("per-site tools", baseline, peak_mb)
+            baseline_per_site = baseline / count
+        elif baseline_per_site:
+            baseline = baseline_per_site * count
+            print(f"  {'per-site tools':<24} {baseline * 1000:9.1f} ms  (extrapolated)")
+        seconds, peak_mb = measure(opportunity_planner.plan_sites, sites, kmls, {"bench": catalogue},
+                                   {"bench": histories[history_project]}, repeat=repeat)
+        report("shared stages", seconds, peak_mb, baseline=baseline)
+
+
+# Modules imported by each `python -m acquisition_forecaster` command, and the budget (ms of imports on top of the
+# bare interpreter) that the startup benchmark fails above
+STARTUP_IMPORTS = {
+    "plans": ["acquisition_forecaster.plan_parser"],
+    "passes": ["acquisition_forecaster.pass_forecaster"],
+    "acquire": ["acquisition_forecaster.historical_analysis", "pystac_client"],
+    "stats": ["acquisition_forecaster.historical_analysis"],
+    "plot": ["acquisition_forecaster.historical_analysis", "matplotlib.pyplot"],
+    "catalog": ["acquisition_forecaster.local_catalog"],
+    "opportunities": ["acquisition_forecaster.opportunity_planner"],
+}
+STARTUP_BUDGET_MS = {"plans": 800, "passes": 300, "acquire": 800, "stats": 700, "plot": 1200, "catalog": 400,
+                     "opportunities": 900}
+
+
+# The former entry points imported every dependency of their module whatever the action: historical_analysis
+# imported pyplot at the top, the original pass_forecaster only skyfield, json and datetime
+LEGACY_STARTUP_IMPORTS = {
+    "stats (former)": ["acquisition_forecaster.historical_analysis", "matplotlib.pyplot"],
+    "passes (former)": ["skyfield.api", "json", "datetime"],
+}
+
+
+def import_profile(modules):
+    # Wall time of an interpreter importing `modules`, and its -X importtime entries as (depth, name, cumulative ms)
+    code = "; ".join(f"import {module}" for module in ["acquisition_forecaster.__main__", *modules])
+    t0 = time.perf_counter()
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code if modules else "pass"],
+                            capture_output=True, text=True, check=True).stderr
+    seconds = time.perf_counter() - t0
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            entries.append((depth, name.strip(), int(cumulative) / 1000))
+    return seconds, entries
+
+
+def bench_startup(repeat):
+    # Start-up cost of every CLI command, best of `repeat` interpreters; returns the commands over budget
+    def best(modules):
+        runs = [import_profile(modules) for _ in range(repeat)]
+        total = [sum(ms for depth, _, ms in entries if depth == 0) for _, entries in runs]
+        k = int(np.argmin(total))
+        return min(seconds for seconds, _ in runs), total[k], runs[k][1]
+
+    _, bare_ms, _ = best([])
+    print(f"CLI start-up, best of {repeat} interpreters (imports: -X importtime beyond the bare interpreter's "
+          f"{bare_ms:.0f} ms)")
+    over = []
+    for command, modules in {**STARTUP_IMPORTS, **LEGACY_STARTUP_IMPORTS}.items():
+        seconds, total_ms, entries = best(modules)
+        imports_ms = total_ms - bare_ms
+        heaviest = sorted((entry for entry in entries if entry[0] <= 1 and entry[1] != "site"
+                           and not entry[1].startswith("acquisition_forecaster")), key=lambda entry: -entry[2])
+        budget = STARTUP_BUDGET_MS.get(command)
+        if budget is None:
+            budget_text = ""
+        else:
+            budget_text = f"/ {budget:4d} ms budget{' EXCEEDED' if imports_ms > budget else ''}"
+            if imports_ms > budget:
+                over.append(command)
+        print(f"  {command:<16} {seconds * 1000:6.0f} ms wall  {imports_ms:6.0f} ms imports {budget_text:<26} "
+              f"({', '.join(f'{name} {ms:.0f}' for _, name, ms in heaviest[:3])})")
+    return over
+
+
+# Benchmark name: function of the parsed arguments running it (startup returns the commands over budget)
+BENCHES = {
+    "plan_parser": lambda args: bench_plan_parser(args.project, args.repeat, args.copies),
+    "pushdown": lambda args: bench_pushdown(args.project, args.repeat, args.copies),
+    "sites": lambda args: bench_sites(args.project, args.repeat, args.max_sites, args.naive_max_sites),
+    "cache": lambda args: bench_cache(args.project, args.repeat),
+    "workers": lambda args: bench_workers(args.project, args.repeat, args.copies, args.max_workers),
+    "passes": lambda args: bench_passes(args.pass_projects, args.repeat),
+    "adaptive": lambda args: bench_adaptive(args.pass_projects, args.repeat, args.days),
+    "network": lambda args: bench_network(args.project, args.repeat, args.satellites, args.stations, args.workers),
+    "stac": lambda args: bench_stac(args.project, args.repeat, args.years, args.latency,
+                                    max(args.workers, historical_analysis.WORKERS)),
+    "store": lambda args: bench_store(args.project, args.repeat, args.years, args.latency,
+                                      max(args.workers, historical_analysis.WORKERS)),
+    "revisit": lambda args: bench_revisit(args.repeat, args.items, args.sites, args.years, args.naive_max_sites),
+    "startup": lambda args: bench_startup(args.repeat),
+    "planner": lambda args: bench_planner(args.project, args.history_project, args.repeat, args.max_sites,
+                                          args.naive_max_sites, args.satellites),
+}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmarks for the acquisition forecaster")
+    parser.add_argument("bench", type=str, choices=BENCHES, help="Benchmark to run")
+    parser.add_argument("--project", type=str, default="eetac_27_11_25", help="Project name")
+    parser.add_argument("--history-project", type=str, default="eetac_2025",
+                        help="Project whose acquisition history the planner benchmark uses")
+    parser.add_argument("--pass-projects", type=str, nargs="+", default=["eetac_27_11_25", "troll_27_11_25"],
+                        help="Projects used by the passes benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per variant, the best one is reported")
+    parser.add_argument("--copies", type=int, default=1, help="Times the project's plan set is replicated")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(),
+                        help="Largest pool size for the workers benchmark")
+    parser.add_argument("--days", type=int, default=365, help="Window length for the adaptive benchmark")
+    parser.add_argument("--years", type=int, default=5, help="History length for the stac benchmark")
+    parser.add_argument("--latency", type=float, default=0.2, help="Emulated seconds per query for the stac benchmark")
+    parser.add_argument("--satellites", type=int, default=200, help="Catalogue size for the network benchmark")
+    parser.add_argument("--stations", type=int, default=30, help="Station count for the network benchmark")
+    parser.add_argument("--workers", type=int, default=1, help="Pool size for the network benchmark")
+    parser.add_argument("--items", type=int, default=1000000, help="Catalogue size for the revisit benchmark")
+    parser.add_argument("--sites", type=int, default=30, help="Site count for the revisit benchmark")
+    parser.add_argument("--max-sites", type=int, default=10000, help="Largest site count for the sites benchmark")
+    parser.add_argument("--naive-max-sites", type=int, default=100,
+                        help="Largest site count the per-site apply baseline is run for")
+    args = parser.parse_args()
+
+    if BENCHES[args.bench](args):
+        raise SystemExit("Start-up over budget")
@@ -1,95 +1,235 @@
-from pystac_client import Client
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta  # for month intervals
 import json
 import os
+import time
 from shapely.geometry import Point, mapping
 
-CATALOG = Client.open("https://earth-search.aws.element84.com/v1")
+from acquisition_forecaster import acquisition_store, revisit_analysis
 
+STAC_URL = "https://earth-search.aws.element84.com/v1"
+CHUNK_SIZE = relativedelta(months=3)    # Chunk the query to prevent overloading the server
+WORKERS = 4                             # concurrent chunk queries, kept low for the same reason
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
 
-def acquire(project):
-    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
-    pt = Point(config["POINT"][0], config["POINT"][1])
 
-    start_date = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
-    end_date = datetime.strptime(config["END_DATE"], "%Y-%m-%d")
+@lru_cache(maxsize=None)
+def open_catalog(url=STAC_URL):
+    # Opened on first use rather than at import time, which costs a network round trip.
+    # A path to local STAC items gives the offline stand-in instead
+    if os.path.exists(url):
+        from acquisition_forecaster.local_catalog import LocalCatalog
+        return LocalCatalog(url)
 
-    chunk_size = relativedelta(months=3)    # Chunk the query to prevent overloading the server
+    from pystac_client import Client
+    return Client.open(url)
 
-    current_start = start_date
-    all_items = []
 
+def date_chunks(start_date, end_date, chunk_size=CHUNK_SIZE):
+    # Ranges are inclusive of their end day, like the STAC API interprets them
+    if start_date == end_date:
+        yield f"{start_date.date()}/{end_date.date()}"
+    current_start = start_date
     while current_start < end_date:
         current_end = min(current_start + chunk_size, end_date)
-        date_range = f"{current_start.date()}/{current_end.date()}"
-        print(f"Querying: {date_range}")
-
-        search = CATALOG.search(
-            collections=["sentinel-2-l2a"],
-            intersects=mapping(pt),
-            datetime=date_range,
-            limit=1000,
-        )
+        yield f"{current_start.date()}/{current_end.date()}"
+        current_start = current_end
+
+
+def search_chunk(catalog, geometry, date_range, retries=RETRIES, backoff=BACKOFF_SECONDS):
+    # The chunk's items, or None when the query still fails after `retries` retries
+    print(f"Querying: {date_range}")
+    for attempt in range(retries + 1):
         try:
-            items = list(search.items())
-            all_items.extend(items)
+            search = catalog.search(
+                collections=["sentinel-2-l2a"],
+                intersects=mapping(geometry),
+                datetime=date_range,
+                limit=1000,
+            )
+            return list(search.items())
         except Exception as e:
-            print(f"Error on {date_range}: {e}")
+            if attempt == retries:
+                print(f"Error on {date_range}: {e}")
+                return None
+            time.sleep(backoff * 2 ** attempt)  # exponential backoff before retrying
 
-        current_start = current_end
 
-    data = []
-    for item in all_items:
-        dt = item.datetime
-        data.append({
-            'satellite': item.id[:3],
-            'datetime': dt,
-            'day_of_week': dt.strftime('%A'),
-            'hour': dt.hour + dt.minute / 60
-        })
-
-    df = pd.DataFrame(data)
-    df = df.sort_values(by='datetime')  # ascending by default
-    df['days_since_last'] = df['datetime'].diff().dt.total_seconds() / (3600 * 24)
-
-    # Create empty columns to hold results
-    df['days_since_last_s2a'] = None
-    df['days_since_last_s2b'] = None
-    df['days_since_last_s2c'] = None
-
-    # Compute per-satellite differences
-    for sat in ['S2A', 'S2B', 'S2C']:
-        mask = df['satellite'] == sat
-        diffs = df.loc[mask, 'datetime'].diff().dt.total_seconds() / (3600 * 24)
-        df.loc[mask, f'days_since_last_{sat.lower()}'] = diffs
+def fetch_chunks(catalog, geometry, start_date, end_date, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    # (date range, items) per chunk, items being None for the chunks whose query failed
+    date_ranges = list(date_chunks(start_date, end_date, chunk_size))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(zip(date_ranges,
+                        pool.map(lambda date_range: search_chunk(catalog, geometry, date_range), date_ranges)))
+
+
+def merge_items(chunks):
+    # Merge in chunk order. Date ranges share their boundary day, so items found twice are dropped
+    all_items = []
+    seen = set()
+    for items in chunks:
+        for item in items:
+            if item.id not in seen:
+                seen.add(item.id)
+                all_items.append(item)
+    return all_items
+
+
+def fetch_items(catalog, geometry, start_date, end_date, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    # Items of the chunks that could be queried, failed chunks are reported by search_chunk
+    chunks = fetch_chunks(catalog, geometry, start_date, end_date, workers, chunk_size)
+    return merge_items(items for _, items in chunks if items is not None)
+
+
+def fetch_incremental(store, catalog, geometry, start_date, end_date, workers=WORKERS):
+    # Only query the days of [start_date, end_date] missing from the store, then read the window back from it
+    start_day, end_day = start_date.date(), end_date.date() + timedelta(days=1)
+    settled = acquisition_store.settled_until()
+    for missing_start, missing_end in acquisition_store.missing_ranges(
+            acquisition_store.load_coverage(store), start_day, end_day):
+        chunks = fetch_chunks(catalog, geometry, datetime.combine(missing_start, datetime.min.time()),
+                              datetime.combine(missing_end - timedelta(days=1), datetime.min.time()), workers)
+        acquisition_store.append_items(store, item_records(
+            merge_items(items for _, items in chunks if items is not None)))
+
+        # Only the days of the chunks that were queried are covered (a chunk includes its end day), so the days
+        # of a failed chunk are queried again next run
+        for date_range, items in chunks:
+            if items is None:
+                continue
+            first, last = (date.fromisoformat(day) for day in date_range.split("/"))
+            covered_end = min(last + timedelta(days=1), missing_end, settled)
+            if covered_end > first:
+                acquisition_store.add_coverage(store, first, covered_end)
+        failed = [date_range for date_range, items in chunks if items is None]
+        if failed:
+            print(f"{len(failed)} chunk(s) failed ({', '.join(failed)}), queried again on the next run")
+    return acquisition_store.read_items(store, start_day, end_day)
+
+
+def acquire(project, catalog=None, workers=WORKERS, incremental=True):
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    pt = Point(config["POINT"][0], config["POINT"][1])
+
+    start_date = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
+    end_date = datetime.strptime(config["END_DATE"], "%Y-%m-%d")
+    output = f"acquisition_forecaster/projects/{project}/output/sentinel2_acquisitions.pkl"
+
+    if incremental:
+        records = fetch_incremental(acquisition_store.store_dir(project), catalog or open_catalog(), pt,
+                                    start_date, end_date, workers)
+        previous = pd.read_pickle(output) if os.path.exists(output) else None
+        df = extend_revisit_table(previous, records)
+    else:
+        df = build_dataframe(fetch_items(catalog or open_catalog(), pt, start_date, end_date, workers))
 
     print(df)
     os.makedirs(f"acquisition_forecaster/projects/{project}/output/", exist_ok=True)
-    df.to_pickle(f"acquisition_forecaster/projects/{project}/output/sentinel2_acquisitions.pkl")
+    df.to_pickle(output)
+    return df
 
 
-def plot(project):
+def item_records(all_items):
+    return pd.DataFrame({
+        "id": pd.Series([item.id for item in all_items], dtype=str),
+        "satellite": pd.Series([item.id[:3] for item in all_items], dtype=str),
+        "datetime": pd.to_datetime([item.datetime for item in all_items], utc=True),
+    })
+
+
+def build_dataframe(all_items):
+    return revisit_analysis.revisit_table(item_records(all_items))
+
+
+def same_instants(a, b):
+    return len(a) == len(b) and (pd.to_datetime(a.values, utc=True) == pd.to_datetime(b.values, utc=True)).all()
+
+
+def extend_revisit_table(previous, records):
+    # When the records only add acquisitions after the last one of `previous`, the revisit columns are computed
+    # for that tail alone, seeded with the last previous acquisition overall and per satellite. Otherwise (first
+    # run, widened or moved window) the table is rebuilt
+    if previous is None or previous.empty or records.empty:
+        return revisit_analysis.revisit_table(records)
+
+    last = pd.Timestamp(previous["datetime"].max())
+    is_new = records["datetime"] > last
+    if not same_instants(records.loc[~is_new, "datetime"].sort_values(), previous["datetime"].sort_values()):
+        return revisit_analysis.revisit_table(records)
+    if not is_new.any():
+        return previous
+
+    seeds = previous.sort_values("datetime").groupby("satellite", observed=True).tail(1)[["satellite", "datetime"]]
+    new = records.loc[is_new, ["satellite", "datetime"]]
+    tail = revisit_analysis.revisit_table(pd.concat([seeds.astype({"satellite": str}), new], ignore_index=True))
+    tail = tail[tail["datetime"] > last]
+    if not set(tail.columns) <= set(previous.columns):
+        return revisit_analysis.revisit_table(records)  # a satellite not seen before needs its own column
+
+    tail.index = range(len(previous), len(previous) + len(tail))
+    df = pd.concat([previous.astype({"satellite": str}), tail[previous.columns].astype({"satellite": str})])
+    return df.astype({"satellite": "category"})
+
+
+def stats(project, window="90D"):
+    df = pd.read_pickle(f"acquisition_forecaster/projects/{project}/output/sentinel2_acquisitions.pkl")
+    if "days_since_last_satellite" not in df.columns:
+        df = revisit_analysis.revisit_table(df)  # table written before the per-satellite gap column existed
+
+    print(revisit_analysis.revisit_stats(df))
+    rolling = revisit_analysis.rolling_revisit(df, window)
+    print(f"Latest {window} rolling median revisit (days):")
+    print(rolling.groupby("satellite").tail(1).to_string(index=False))
+
+
+def plot(project, output=None):
+    # Shown in a window, or saved to `output` (any format matplotlib infers from the extension)
+    import matplotlib.pyplot as plt  # only plotting pays for the GUI stack
+
     df = pd.read_pickle(f"acquisition_forecaster/projects/{project}/output/sentinel2_acquisitions.pkl")
 
     plt.plot(df['datetime'], df['days_since_last'], marker='o', linestyle='-', label='All Satellites')
-    plt.plot(df['datetime'], df['days_since_last_s2a'], marker='o', linestyle='-', label='S2A')
-    plt.plot(df['datetime'], df['days_since_last_s2b'], marker='x', linestyle='-', label='S2B')
-    plt.plot(df['datetime'], df['days_since_last_s2c'], marker='s', linestyle='-', label='S2C')
+    for satellite, marker in zip(revisit_analysis.satellites(df), ['o', 'x', 's', '^', 'v', 'D']):
+        column = f'days_since_last_{satellite.lower()}'
+        plt.plot(df['datetime'], df[column].astype(float), marker=marker, linestyle='-', label=satellite)
     plt.legend()
-    plt.show()
+    if output:
+        plt.savefig(output)
+        plt.close()
+    else:
+        plt.show()
+
+
+def add_arguments(parser, actions=("acquire", "plot", "stats")):
+    # Options of `actions` in this module's CLI, shared with the acquire, plot and stats commands of
+    # `python -m acquisition_forecaster`
+    parser.add_argument("--project", type=str, required=True, help="Project name")
+    if "acquire" in actions:
+        parser.add_argument("--catalog", type=str, default=STAC_URL,
+                            help="STAC API URL, or a local file/directory of STAC items to work offline")
+        parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent chunk queries")
+        parser.add_argument("--full", action="store_true",
+                            help="Query the whole date range again instead of only the days missing from the item"
+                                 " store")
+    if "stats" in actions:
+        parser.add_argument("--window", type=str, default="90D", help="Rolling median window of the statistics")
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Acquire and plot Sentinel-2 acquisition dates")
-    parser.add_argument("--project", type=str, required=True, help="Project name")
-    parser.add_argument("--action", type=str, choices=["acquire", "plot"], required=True, help="Action to perform")
+    parser.add_argument("--action", type=str, choices=["acquire", "plot", "stats"], required=True,
+                        help="Action to perform")
+    add_arguments(parser)
     args = parser.parse_args()
 
     if args.action == "acquire":
-        acquire(args.project)
+        acquire(args.project, open_catalog(args.catalog), args.workers, incremental=not args.full)
     elif args.action == "plot":
         plot(args.project)
+    elif args.action == "stats":
+        stats(args.project, args.window)
@@ -0,0 +1,129 @@
+from datetime import datetime, time, timedelta, timezone
+import json
+import os
+import time as clock
+
+from pystac import Item
+from shapely.geometry import Point, mapping, shape
+
+# Sentinel-2 satellites and their phase in a 10-day repeat cycle, for synthetic catalogues
+S2_PHASES = {"S2A": 0, "S2B": 5, "S2C": 2.5}
+S2_REPEAT_DAYS = 10
+
+
+def parse_datetime(value, end=False):
+    # Same expansion as pystac_client: a bare date at the end of a range means the end of that day
+    if len(value) == 10:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        moment = datetime.combine(day, time.max) if end else day
+        return moment.replace(tzinfo=timezone.utc)
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class LocalSearch:
+    def __init__(self, items):
+        self._items = items
+
+    def items(self):
+        return iter(self._items)
+
+
+class LocalCatalog:
+    # File-backed stand-in for pystac_client.Client: search() supports the collections, intersects, datetime and
+    # limit arguments used by historical_analysis. Items are read from a GeoJSON FeatureCollection, a
+    # newline-delimited file of STAC items, or a directory of item JSON files. `latency` (s) is added to each
+    # search to emulate a remote endpoint
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.items = sorted(load_items(path), key=lambda item: item.datetime)
+
+    def search(self, collections=None, intersects=None, datetime=None, limit=None, **kwargs):
+        if self.latency:
+            clock.sleep(self.latency)
+
+        start = end = None
+        if datetime:
+            start_text, _, end_text = datetime.partition("/")
+            start = parse_datetime(start_text) if start_text not in ("", "..") else None
+            end = parse_datetime(end_text or start_text, end=True) if end_text != ".." else None
+        geometry = shape(intersects) if intersects else None
+
+        matches = [
+            item for item in self.items
+            if (collections is None or item.collection_id in collections)
+            and (start is None or item.datetime >= start)
+            and (end is None or item.datetime <= end)
+            and (geometry is None or shape(item.geometry).intersects(geometry))
+        ]
+        return LocalSearch(matches)
+
+
+def load_items(path):
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name)) as f:
+                    yield Item.from_dict(json.load(f))
+        return
+
+    with open(path) as f:
+        if path.endswith(".ndjson") or path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield Item.from_dict(json.loads(line))
+            return
+        for feature in json.load(f)["features"]:
+            yield Item.from_dict(feature)
+
+
+def write_synthetic_catalog(path, geometry, start_date, end_date, tile="31TDF"):
+    # Sentinel-2 L2A items over `geometry` at the nominal revisit of each satellite, as newline-delimited JSON
+    footprint = shape(geometry).buffer(0.5).envelope
+    n_items = 0
+    with open(path, "w") as f:
+        for satellite, phase in S2_PHASES.items():
+            day = start_date + timedelta(days=phase)
+            while day < end_date:
+                acquired = day.replace(hour=10, minute=56, tzinfo=timezone.utc)
+                item = Item(
+                    id=f"{satellite}_{tile}_{acquired:%Y%m%d}_0_L2A",
+                    geometry=mapping(footprint),
+                    bbox=list(footprint.bounds),
+                    datetime=acquired,
+                    properties={},
+                    collection="sentinel-2-l2a",
+                )
+                f.write(json.dumps(item.to_dict()) + "\n")
+                n_items += 1
+                day += timedelta(days=S2_REPEAT_DAYS)
+    return n_items
+
+
+def write_project_catalog(project, path):
+    # Synthetic catalogue over a project's config POINT and date range
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    return write_synthetic_catalog(
+        path,
+        mapping(Point(config["POINT"][0], config["POINT"][1])),
+        datetime.strptime(config["START_DATE"], "%Y-%m-%d"),
+        datetime.strptime(config["END_DATE"], "%Y-%m-%d"),
+    )
+
+
+def add_arguments(parser):
+    # Options of this module's CLI, shared with `python -m acquisition_forecaster catalog`
+    parser.add_argument("--project", type=str, required=True, help="Project name")
+    parser.add_argument("--output", type=str, required=True, help="Newline-delimited JSON file to write")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Write a synthetic Sentinel-2 STAC catalogue for a project's point"
+                                                 " and date range, to run historical_analysis offline")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    n = write_project_catalog(args.project, args.output)
+    print(f"Wrote {n} items to {args.output}")
@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from acquisition_forecaster import pass_forecaster, plan_parser, revisit_analysis
+
+# Upcoming capture opportunities of many sites from three sources, each stage run once for all of them: the
+# acquisition plans (parsed once, one spatial index query), the TLE passes (one propagation per satellite shared
+# by every site) and the acquisition history (one grouped pass over the projects' revisit tables)
+PROJECTS_DIR = "acquisition_forecaster/projects"
+SOURCE_WEIGHTS = {"plan": 1.0, "pass": 0.8, "history": 0.5}  # scheduled > geometric > extrapolated
+CALIBRATION_QUALITY = 0.5  # plan modes other than NOBS (nominal observation) are calibration takes
+REGULARITY_TOLERANCE = 0.1  # a historical gap within 10% of the median counts as regular
+OPPORTUNITY_COLUMNS = ["site", "rank", "source", "satellite", "start", "end", "score", "detail"]
+
+
+def list_projects(projects_dir=PROJECTS_DIR):
+    return sorted(os.path.basename(os.path.dirname(os.path.dirname(path)))
+                  for path in glob.glob(f"{projects_dir}/*/input/config.json"))
+
+
+def project_sites(projects, projects_dir=PROJECTS_DIR):
+    # One row per site: the config "SITES" ({name: [lon, lat]}, named <project>/<name>) or the project's POINT,
+    # with the project's [START_DATE, END_DATE + 1 day) window
+    rows = []
+    for project in projects:
+        with open(f"{projects_dir}/{project}/input/config.json") as f:
+            config = json.load(f)
+        start = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
+        end = datetime.strptime(config["END_DATE"], "%Y-%m-%d") + timedelta(days=1)
+        sites = {f"{project}/{name}": point for name, point in config["SITES"].items()} if "SITES" in config \
+            else {project: config["POINT"]}
+        rows += [{"site": name, "project": project, "lon": point[0], "lat": point[1], "start": start, "end": end}
+                 for name, point in sites.items()]
+    return pd.DataFrame(rows, columns=["site", "project", "lon", "lat", "start", "end"])
+
+
+def project_inputs(projects, projects_dir=PROJECTS_DIR):
+    # The shared inputs: plan files (one per distinct content, whichever project holds it), each project's TLE
+    # catalogue and revisit table
+    kmls = {}
+    for project in projects:
+        for kml in sorted(glob.glob(f"{projects_dir}/{project}/input/sentinel_plans/*.kml")):
+            kmls.setdefault(plan_parser.file_digest(kml), kml)
+
+    catalogues, histories = {}, {}
+    for project in projects:
+        tle_path = f"{projects_dir}/{project}/input/tle"
+        if os.path.exists(tle_path):
+            catalogues[project] = pass_forecaster.load_tle_catalogue(tle_path)
+        history_path = f"{projects_dir}/{project}/output/sentinel2_acquisitions.pkl"
+        if os.path.exists(history_path):
+            histories[project] = pd.read_pickle(history_path)
+    return list(kmls.values()), catalogues, histories
+
+
+def to_naive_utc(values):
+    values = pd.to_datetime(values)
+    return values.dt.tz_convert("UTC").dt.tz_localize(None) if values.dt.tz is not None else values
+
+
+def plan_opportunities(sites, kmls, workers=1):
+    # Planned acquisitions whose swath contains the site, inside the site's window
+    if not kmls or sites.empty:
+        return pd.DataFrame(columns=OPPORTUNITY_COLUMNS[:1] + OPPORTUNITY_COLUMNS[2:])
+    plans = plan_parser.load_plans(kmls, workers=workers)
+    matches = plan_parser.match_sites(plans, plan_parser.load_sites(list(zip(sites["lon"], sites["lat"]))))
+    site = matches["site"].to_numpy()
+    start, end = to_naive_utc(matches["capture_start"]), to_naive_utc(matches["capture_end"])
+    inside = ((start.to_numpy() >= sites["start"].to_numpy()[site]) &
+              (end.to_numpy() < sites["end"].to_numpy()[site]))
+    matches = matches[inside]
+    mode = matches["acquisition_type"].str.split(" ").str[0]
+    return pd.DataFrame({
+        "site": sites["site"].to_numpy()[matches["site"].to_numpy()],
+        "source": "plan",
+        "satellite": matches["satellite"].to_numpy(),
+        "start": start[inside].to_numpy(),
+        "end": end[inside].to_numpy(),
+        "score": SOURCE_WEIGHTS["plan"] * np.where(mode == "NOBS", 1.0, CALIBRATION_QUALITY),
+        "detail": matches["acquisition_type"].to_numpy(),
+    })
+
+
+def pass_opportunities(sites, catalogues, workers=1, adaptive=True):
+    # Passes over every site of the objects in its project's TLE file. The union of all catalogues is propagated
+    # once over the union of the windows with every site as an observer, then each pass is kept if it falls in its
+    # site's window and its object belongs to the site's project
+    sites = sites[sites["project"].isin(catalogues)]
+    if sites.empty:
+        return pd.DataFrame(columns=OPPORTUNITY_COLUMNS[:1] + OPPORTUNITY_COLUMNS[2:])
+    catalogue = list(dict.fromkeys(tle for project in sites["project"].unique() for tle in catalogues[project]))
+    stations = {site: (lon, lat) for site, lon, lat in zip(sites["site"], sites["lon"], sites["lat"])}
+    passes = pass_forecaster.forecast_network(catalogue, stations, sites["start"].min().to_pydatetime(),
+                                              sites["end"].max().to_pydatetime(), workers, adaptive)
+
+    window = sites.set_index("site")
+    members = {(project, name) for project in catalogues for name, _, _ in catalogues[project]}
+    project = window["project"].reindex(passes["station"]).to_numpy()
+    keep = ((passes["aos"].to_numpy() >= window["start"].reindex(passes["station"]).to_numpy()) &
+            (passes["los"].to_numpy() <= window["end"].reindex(passes["station"]).to_numpy()) &
+            np.array([(p, s) in members for p, s in zip(project, passes["satellite"])], dtype=bool))
+    passes = passes[keep]
+    return pd.DataFrame({
+        "site": passes["station"].to_numpy(),
+        "source": "pass",
+        "satellite": passes["satellite"].to_numpy(),
+        "start": passes["aos"].to_numpy(),
+        "end": passes["los"].to_numpy(),
+        "score": SOURCE_WEIGHTS["pass"] * np.sin(np.radians(passes["max_elevation"].to_numpy())),
+        "detail": [f"max {elevation:.1f}° at {tca:%H:%M:%S}" for elevation, tca in
+                   zip(passes["max_elevation"], passes["tca"])],
+    })
+
+
+def history_opportunities(sites, histories, tolerance=REGULARITY_TOLERANCE):
+    # Acquisitions extrapolated from each project's history: from the last acquisition of every satellite, one
+    # every median revisit gap inside the site's window, scored by the share of gaps within `tolerance` of the
+    # median. Gap statistics are computed once per project, then spread to its sites
+    sites = sites[sites["project"].isin(histories)]
+    if sites.empty:
+        return pd.DataFrame(columns=OPPORTUNITY_COLUMNS[:1] + OPPORTUNITY_COLUMNS[2:])
+    tables = []
+    for project, df in histories.items():
+        if "days_since_last_satellite" not in df.columns:
+            df = revisit_analysis.revisit_table(df)  # table written before the per-satellite gap column existed
+        tables.append(pd.DataFrame({"project": project, "satellite": df["satellite"].astype(str).to_numpy(),
+                                    "datetime": to_naive_utc(df["datetime"]).to_numpy(),
+                                    "gap": df["days_since_last_satellite"].to_numpy(dtype=float)}))
+    history = pd.concat(tables, ignore_index=True)
+    grouped = history.groupby(["project", "satellite"])
+    cadence = grouped.agg(last=("datetime", "max"), median=("gap", "median"))
+    median = grouped["gap"].transform("median")
+    regular = ((history["gap"] - median).abs() <= tolerance * median).where(history["gap"].notna())
+    cadence["regularity"] = regular.astype(float).groupby([history["project"], history["satellite"]]).mean()
+    cadence = cadence[cadence["median"] > 0].reset_index()
+
+    # Every (site, satellite) pair of the site's project, then k = first..last gaps after the last acquisition
+    pairs = sites.merge(cadence, on="project")
+    period = pd.to_timedelta(pairs["median"], unit="D")
+    first = np.maximum(np.ceil((pairs["start"] - pairs["last"]) / period), 1).astype(int)
+    last = np.ceil((pairs["end"] - pairs["last"]) / period).astype(int) - 1
+    counts = np.maximum(last - first + 1, 0).to_numpy()
+    rows = np.repeat(np.arange(len(pairs)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first.to_numpy(), counts)
+    pairs = pairs.iloc[rows]
+    moments = pairs["last"].to_numpy() + k * period.to_numpy()[rows]
+    return pd.DataFrame({
+        "site": pairs["site"].to_numpy(),
+        "source": "history",
+        "satellite": pairs["satellite"].to_numpy(),
+        "start": moments,
+        "end": moments,
+        "score": SOURCE_WEIGHTS["history"] * pairs["regularity"].to_numpy(),
+        "detail": [f"every {median:.1f} d" for median in pairs["median"]],
+    })
+
+
+def rank(opportunities):
+    # Per site, best score first, earliest first among equals
+    df = opportunities.sort_values(["site", "score", "start"], ascending=[True, False, True], ignore_index=True)
+    df["start"], df["end"] = df["start"].dt.round("ms"), df["end"].dt.round("ms")
+    df.insert(1, "rank", df.groupby("site").cumcount() + 1)
+    return df[OPPORTUNITY_COLUMNS]
+
+
+def plan_sites(sites, kmls, catalogues, histories, workers=1, adaptive=True):
+    frames = [plan_opportunities(sites, kmls, workers), pass_opportunities(sites, catalogues, workers, adaptive),
+              history_opportunities(sites, histories)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=OPPORTUNITY_COLUMNS)
+    return rank(pd.concat(frames, ignore_index=True))
+
+
+def main(projects=None, workers=1, adaptive=True, output=None):
+    # Ranked opportunities of every site of `projects` (default: all), written to `output` (CSV) if given
+    projects = projects or list_projects()
+    table = plan_sites(project_sites(projects), *project_inputs(projects), workers, adaptive)
+    if output:
+        table.to_csv(output, index=False)
+    return table
+
+
+def add_arguments(parser):
+    # Options of this module's CLI, shared with `python -m acquisition_forecaster opportunities`
+    parser.add_argument("--projects", type=str, nargs="+", default=None, help="Project names (default: all)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used for plan parsing and propagation")
+    parser.add_argument("--fixed-step", action="store_true", help="Sample every pass window instead of screening")
+    parser.add_argument("--top", type=int, default=5, help="Opportunities printed per site")
+    parser.add_argument("--output", type=str, default=None, help="CSV file for the full table")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rank the upcoming capture opportunities of every project site from"
+                                                 " acquisition plans, TLE passes and acquisition history")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    table = main(args.projects, args.workers, not args.fixed_step, args.output)
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 40):
+        print(table[table["rank"] <= args.top].to_string(index=False))
@@ -1,11 +1,35 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from sgp4.api import jday
 from skyfield.api import EarthSatellite, load, wgs84
+from skyfield.sgp4lib import TEME_to_ITRF
+import numpy as np
 import json
 
 ELEVATION_MIN_DEG = 0
 STEP_SECONDS = 30
+CHUNK_SAMPLES = 2000    # samples propagated per batch, bounds the (3, observers, samples) temporaries
+BISECTION_STEPS = 15    # STEP_SECONDS / 2**15 ~ 1 ms on the AOS/LOS times
+GOLDEN_STEPS = 25       # 2 * STEP_SECONDS * 0.618**25 ~ 1 ms on the time of closest approach
+COARSE_STEP_SECONDS = 20 * STEP_SECONDS  # screening step of the adaptive search, a multiple of STEP_SECONDS
+SCREEN_MARGIN_DEG = 1.0
+EARTH_POLAR_RADIUS_KM = 6356.752          # smallest radius, gives the widest (safest) visibility cone
+EARTH_ROTATION_RAD_S = 7.2921159e-5
+MU_EARTH_KM3_S2 = 398600.4418
 
-def overflight_times(project):
+GOLDEN = (np.sqrt(5) - 1) / 2
+NETWORK_COLUMNS = ["satellite", "station", "aos", "tca", "los", "max_elevation"]
+
+
+@lru_cache(maxsize=None)
+def timescale():
+    # One Skyfield timescale per process, shared by every satellite and pool task
+    return load.timescale()
+
+
+def load_project(project):
     config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
     tle_path = f"acquisition_forecaster/projects/{project}/input/tle"
     with open(tle_path, "r") as f:
@@ -13,13 +37,17 @@ def overflight_times(project):
     if len(tle_lines) < 2:
         raise ValueError("TLE file must contain at least two non-empty lines")
 
-    ts = load.timescale()
+    ts = timescale()
     sat = EarthSatellite(tle_lines[0], tle_lines[1], "SAT", ts)
     observer = wgs84.latlon(config["POINT"][1], config["POINT"][0], 0.0)
 
     start_utc = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
     end_utc = datetime.strptime(config["END_DATE"], "%Y-%m-%d") + timedelta(days=1)
+    return ts, sat, observer, start_utc, end_utc
+
 
+def step_passes(ts, sat, observer, start_utc, end_utc):
+    # Reference implementation: one scalar propagation per sample and linear interpolation of the crossings
     passes = []
     current_pass_start = None
 
@@ -62,19 +90,266 @@ def overflight_times(project):
     return passes
 
 
+def observer_frame(observers):
+    # ITRS position (m) and local geodetic up vector of every observer, as (3, n_observers) arrays
+    xyz = np.array([observer.itrs_xyz.m for observer in observers]).T
+    lat = np.radians([observer.latitude.degrees for observer in observers])
+    lon = np.radians([observer.longitude.degrees for observer in observers])
+    up = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    return xyz, up
 
-# Example usage:
-if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser(description="Estimate satellite pass times")
-    parser.add_argument("--project", type=str, required=True, help="Project name")
-    args = parser.parse_args()
 
-    pass_list = overflight_times(args.project)
+def propagate_itrs(ts, sat, start_utc, offsets):
+    # Satellite ITRS position (m) at `offsets` seconds from start_utc, as a (3, n) array. SGP4 output is rotated
+    # from TEME with the sidereal angle only, which matches Skyfield's altaz to 1e-12 deg and skips the costly
+    # nutation series it evaluates for every new time array
+    t = ts.utc(start_utc.year, start_utc.month, start_utc.day,
+               start_utc.hour, start_utc.minute, start_utc.second + offsets)
+    jd, fr = jday(start_utc.year, start_utc.month, start_utc.day, start_utc.hour, start_utc.minute, start_utc.second)
+    _, r, v = sat.model.sgp4_array(np.full(offsets.shape, jd), fr + offsets / 86400.0)
+    r_itrs, _ = TEME_to_ITRF(t.whole, r.T, v.T, 0.0, 0.0, t.ut1_fraction)
+    return r_itrs * 1000.0
+
+
+def elevation(sat_xyz, obs_xyz, up):
+    rho = sat_xyz - obs_xyz
+    return np.degrees(np.arcsin(np.sum(rho * up, axis=0) / np.linalg.norm(rho, axis=0)))
+
+
+def screen_offsets(ts, sat, obs_xyz, start_utc, duration, step_seconds, coarse_step_seconds):
+    # Fine sample offsets restricted to the coarse intervals where some observer may see the satellite.
+    # A pass needs the angle between the sub-satellite point and the observer (psi) below the half-angle of the
+    # visibility cone, and psi changes at most as fast as the ground track moves, so over [t_i, t_i+1]
+    # psi >= (psi_i + psi_i+1 - rate * coarse_step) / 2. Intervals where that bound stays above the cone are skipped
+    model = sat.model
+    n = model.no_kozai / 60.0  # rad/s
+    e = model.ecco
+    apogee_km = (MU_EARTH_KM3_S2 / n ** 2) ** (1 / 3) * (1 + e)
+    el = np.radians(ELEVATION_MIN_DEG)
+    half_angle = np.arccos(EARTH_POLAR_RADIUS_KM * np.cos(el) / apogee_km) - el + np.radians(SCREEN_MARGIN_DEG)
+    rate = n * (1 + e) ** 2 / (1 - e ** 2) ** 1.5 + EARTH_ROTATION_RAD_S  # fastest angular rate, at perigee
+
+    coarse = np.append(np.arange(0, duration, coarse_step_seconds, dtype=float), duration)
+    sat_xyz = propagate_itrs(ts, sat, start_utc, coarse)
+    cos_psi = (sat_xyz / np.linalg.norm(sat_xyz, axis=0)).T @ (obs_xyz / np.linalg.norm(obs_xyz, axis=0))
+    psi = np.arccos(np.clip(cos_psi, -1, 1))  # (coarse samples, observers)
+    dt = np.diff(coarse)[:, None]
+    candidate = np.any((psi[:-1] + psi[1:] - rate * dt) / 2 <= half_angle, axis=1)
+
+    # Fine samples of the candidate intervals, edges included; only the last interval can be shorter
+    fine = coarse[:-1][candidate, None] + step_seconds * np.arange(round(coarse_step_seconds / step_seconds))
+    fine = np.concatenate([fine.ravel(), coarse[1:][candidate]])
+    return np.unique(fine[fine <= duration])
+
+
+def search_passes(ts, sat, observers, start_utc, end_utc, step_seconds=STEP_SECONDS, chunk_samples=CHUNK_SAMPLES,
+                  adaptive=False, coarse_step_seconds=COARSE_STEP_SECONDS):
+    # Passes of one satellite over several observers. Returns arrays (observer index, AOS, TCA, LOS in seconds from
+    # start_utc, max elevation in degrees). A pass already in progress at start_utc or still in progress at end_utc
+    # is clipped to the window
+    obs_xyz, up = observer_frame(observers)
+
+    def altitude(offsets, station):
+        # Elevation of each observer station[i] at offsets[i]
+        return elevation(propagate_itrs(ts, sat, start_utc, offsets), obs_xyz[:, station], up[:, station])
+
+    # Sample grid: the satellite is propagated once per sample and shared by all observers. In adaptive mode the
+    # grid has gaps where no observer can see the satellite; the samples around a gap are below the horizon, so
+    # no crossing is ever bracketed across one
+    duration = (end_utc - start_utc).total_seconds()
+    if adaptive:
+        offsets = screen_offsets(ts, sat, obs_xyz, start_utc, duration, step_seconds, coarse_step_seconds)
+    else:
+        offsets = np.append(np.arange(0, duration, step_seconds, dtype=float), duration)
+    if len(offsets) < 2:
+        return np.empty(0, dtype=int), np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    alt = np.concatenate([
+        elevation(propagate_itrs(ts, sat, start_utc, chunk)[:, None, :], obs_xyz[:, :, None], up[:, :, None])
+        for chunk in np.array_split(offsets, max(1, len(offsets) // chunk_samples))
+    ], axis=1)
+
+    above = alt >= ELEVATION_MIN_DEG
+    rise_st, rise_idx = np.nonzero(~above[:, :-1] & above[:, 1:])
+    set_st, set_idx = np.nonzero(above[:, :-1] & ~above[:, 1:])
+
+    # Refine all horizon crossings together: each bracket [lo, hi] holds exactly one sign change
+    idx = np.concatenate([rise_idx, set_idx])
+    station = np.concatenate([rise_st, set_st])
+    rising = np.arange(len(idx)) < len(rise_idx)
+    lo, hi = offsets[idx], offsets[idx + 1]
+    for _ in range(BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        move_hi = (altitude(mid, station) >= ELEVATION_MIN_DEG) == rising
+        hi = np.where(move_hi, mid, hi)
+        lo = np.where(move_hi, lo, mid)
+    crossings = (lo + hi) / 2
+
+    # Passes cut by the window start at the first sample or end at the last one
+    start_st = np.flatnonzero(above[:, 0])
+    end_st = np.flatnonzero(above[:, -1])
+    aos_st = np.concatenate([start_st, rise_st])
+    aos_first = np.concatenate([np.zeros(len(start_st), dtype=int), rise_idx + 1])
+    aos = np.concatenate([np.zeros(len(start_st)), crossings[rising]])
+    los_st = np.concatenate([set_st, end_st])
+    los_last = np.concatenate([set_idx, np.full(len(end_st), len(offsets) - 1)])
+    los = np.concatenate([crossings[~rising], np.full(len(end_st), duration)])
+
+    # Rises and sets alternate for every observer, so once both are sorted the k-th rise pairs with the k-th set
+    aos_order = np.lexsort((aos_first, aos_st))
+    los_order = np.lexsort((los_last, los_st))
+    station, first, aos = aos_st[aos_order], aos_first[aos_order], aos[aos_order]
+    last, los = los_last[los_order], los[los_order]
+
+    # Golden-section search for the culmination around the highest sample of each pass
+    peak = np.array([f + np.argmax(alt[st, f:l + 1]) for st, f, l in zip(station, first, last)], dtype=int)
+    a = np.maximum(offsets[np.maximum(peak - 1, 0)], aos)
+    b = np.minimum(offsets[np.minimum(peak + 1, len(offsets) - 1)], los)
+    c = b - GOLDEN * (b - a)
+    d = a + GOLDEN * (b - a)
+    alt_c, alt_d = altitude(c, station), altitude(d, station)
+    for _ in range(GOLDEN_STEPS):
+        # Keep [a, d] when the peak is left of d, else [c, b]; one of the inner points is reused
+        left = alt_c > alt_d
+        a, b = np.where(left, a, c), np.where(left, d, b)
+        new = np.where(left, b - GOLDEN * (b - a), a + GOLDEN * (b - a))
+        alt_new = altitude(new, station)
+        c, d, alt_c, alt_d = (np.where(left, new, d), np.where(left, c, new),
+                              np.where(left, alt_new, alt_d), np.where(left, alt_c, alt_new))
+    tca = (a + b) / 2
+    max_elevation = altitude(tca, station) if len(tca) else np.empty(0)
+    return station, aos, tca, los, max_elevation
+
+
+def find_passes(ts, sat, observer, start_utc, end_utc, step_seconds=STEP_SECONDS, chunk_samples=CHUNK_SAMPLES,
+                adaptive=False):
+    # Returns (AOS, TCA, LOS, max elevation in degrees) per pass over a single observer
+    _, aos, tca, los, max_elevation = search_passes(ts, sat, [observer], start_utc, end_utc,
+                                                    step_seconds, chunk_samples, adaptive)
+
+    def to_datetime(seconds):
+        return start_utc + timedelta(seconds=float(seconds))
+
+    return [
+        (to_datetime(t_aos), to_datetime(t_tca), to_datetime(t_los), float(el))
+        for t_aos, t_tca, t_los, el in zip(aos, tca, los, max_elevation)
+    ]
+
+
+def load_tle_catalogue(tle_path):
+    # (name, line 1, line 2) per object; accepts both 3-line (named) and bare 2-line element sets.
+    # Unnamed objects are named after their catalogue number
+    with open(tle_path, "r") as f:
+        lines = [line.strip() for line in f.readlines() if line.strip()]
+
+    catalogue = []
+    name = None
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith("1 ") and i + 1 < len(lines) and lines[i + 1].startswith("2 "):
+            catalogue.append((name or lines[i][2:7].strip(), lines[i], lines[i + 1]))
+            name = None
+            i += 2
+        else:
+            name = lines[i].lstrip("0 ").strip()
+            i += 1
 
+    if not catalogue:
+        raise ValueError("TLE file must contain at least one two-line element set")
+    return catalogue
+
+
+def satellite_passes(tle, stations, start_utc, end_utc, adaptive=False):
+    # Pool task: every pass of one catalogue object over all the stations
+    import pandas as pd  # network tables only, so single-satellite forecasts start without pandas
+
+    name, line1, line2 = tle
+    ts = timescale()
+    sat = EarthSatellite(line1, line2, name, ts)
+    names = list(stations)
+    observers = [wgs84.latlon(lat, lon, elevation_m) for lon, lat, elevation_m in stations.values()]
+
+    station, aos, tca, los, max_elevation = search_passes(ts, sat, observers, start_utc, end_utc, adaptive=adaptive)
+    start = pd.Timestamp(start_utc)
+    return pd.DataFrame({
+        "satellite": name,
+        "station": [names[st] for st in station],
+        "aos": start + pd.to_timedelta(aos, unit="s"),
+        "tca": start + pd.to_timedelta(tca, unit="s"),
+        "los": start + pd.to_timedelta(los, unit="s"),
+        "max_elevation": max_elevation,
+    })
+
+
+def forecast_network(catalogue, stations, start_utc, end_utc, workers=1, adaptive=False):
+    # All passes of every catalogue object over every station, as one table sorted by AOS.
+    # `stations` maps a name to (lon, lat) or (lon, lat, elevation in m), like the config POINT
+    import pandas as pd
+
+    stations = {name: (point[0], point[1], point[2] if len(point) > 2 else 0.0) for name, point in stations.items()}
+
+    if workers > 1 and len(catalogue) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(satellite_passes, catalogue, repeat(stations), repeat(start_utc),
+                                   repeat(end_utc), repeat(adaptive),
+                                   chunksize=max(1, len(catalogue) // (4 * workers))))
+    else:
+        tables = [satellite_passes(tle, stations, start_utc, end_utc, adaptive) for tle in catalogue]
+
+    df = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=NETWORK_COLUMNS)
+    return df.sort_values(["aos", "satellite", "station"], ignore_index=True)
+
+
+def forecast_project_network(project, workers=1, adaptive=False):
+    # Every object of the project's TLE file over the config "STATIONS" ({name: [lon, lat]}), or its POINT
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
+    catalogue = load_tle_catalogue(f"acquisition_forecaster/projects/{project}/input/tle")
+    stations = config.get("STATIONS", {project: config["POINT"]})
+
+    start_utc = datetime.strptime(config["START_DATE"], "%Y-%m-%d")
+    end_utc = datetime.strptime(config["END_DATE"], "%Y-%m-%d") + timedelta(days=1)
+    return forecast_network(catalogue, stations, start_utc, end_utc, workers, adaptive)
+
+
+def forecast_passes(project, adaptive=False):
+    ts, sat, observer, start_utc, end_utc = load_project(project)
+    return find_passes(ts, sat, observer, start_utc, end_utc, adaptive=adaptive)
+
+
+def overflight_times(project, adaptive=False):
+    return [(aos, los) for aos, _, los, _ in forecast_passes(project, adaptive)]
+
+
+def report_passes(project, network=False, workers=1, adaptive=False):
+    if network:
+        import pandas as pd
+        with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+            print(forecast_project_network(project, workers, adaptive))
+        return
+
+    pass_list = forecast_passes(project, adaptive)
     if not pass_list:
         print(f"No overflights above {ELEVATION_MIN_DEG}° in the given interval.")
     else:
         print(f"Overflights above {ELEVATION_MIN_DEG}°:")
-        for i, (start, end) in enumerate(pass_list, start=1):
-            print(f"  #{i}: {start}  →  {end} UTC")
+        for i, (start, culmination, end, max_elevation) in enumerate(pass_list, start=1):
+            print(f"  #{i}: {start}  →  {end} UTC, max {max_elevation:.1f}° at {culmination}")
+
+
+def add_arguments(parser):
+    # Options of this module's CLI, shared with `python -m acquisition_forecaster passes`
+    parser.add_argument("--project", type=str, required=True, help="Project name")
+    parser.add_argument("--network", action="store_true",
+                        help="Forecast every object of the TLE file over every config STATIONS entry as one table")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used by --network")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Skip intervals where a pass is geometrically impossible, for long windows")
+
+
+# Example usage:
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Estimate satellite pass times")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    report_passes(args.project, args.network, args.workers, args.adaptive)
@@ -1,108 +1,313 @@
 import xml.etree.ElementTree as ET
 from shapely.geometry import Polygon
 import geopandas as gpd
+import numpy as np
+import shapely
 import pandas as pd
-from shapely.geometry import Point
+from shapely.geometry import Point, shape
+from shapely.geometry.base import BaseGeometry
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import hashlib
 import json
 import glob
+import os
 
+NS = {"kml": "http://www.opengis.net/kml/2.2"}
+PLACEMARK_TAG = f"{{{NS['kml']}}}Placemark"
+COLUMNS = ["capture_start", "capture_end", "polygon", "satellite", "acquisition_type"]
 
-def main(project):
-    ns = {"kml": "http://www.opengis.net/kml/2.2"}
+# Parsed plans are cached per KML content, shared by every project using the same plan files
+CACHE_DIR = "acquisition_forecaster/cache/plans"
+CACHE_MAX_BYTES = 256 * 2**20
 
+
+# With `point`, `start` and `end` set, filters are pushed down into the scan: placemarks outside the
+# [start, end) window or whose footprint does not contain the point are dropped before building anything
+def parse_placemark(pm, satellite, point=None, start=None, end=None):
+    # Time information
+    begin_el = pm.find(".//kml:TimeSpan/kml:begin", NS)
+    end_el = pm.find(".//kml:TimeSpan/kml:end", NS)
+    coords_el = pm.find(".//kml:Polygon//kml:coordinates", NS)
+
+    # Skip if any of the pieces are missing
+    if begin_el is None or end_el is None or coords_el is None:
+        return None
+
+    # Timestamps are kept as ISO strings here and converted in one go once all rows are collected
+    capture_start = begin_el.text.strip()
+    capture_end = end_el.text.strip()
+
+    # ISO 8601 strings sort chronologically, so the date window is checked without parsing them
+    if start is not None and capture_start < start:
+        return None
+    if end is not None and capture_end >= end:
+        return None
+
+    mode = None
+    timeliness = None
+    for data in pm.findall(".//kml:Data", NS):
+        name = data.attrib.get("name")
+        val_el = data.find("kml:value", NS)
+        if val_el is None or not val_el.text:
+            continue
+        val = val_el.text.strip()
+        if name == "Mode":
+            mode = val  # e.g. 'NOBS', 'DARK-O', 'VIC'
+        elif name == "Timeliness":
+            timeliness = val  # e.g. 'NOMINAL'
+
+    # e.g. 'NOBS NOMINAL', 'DARK-O NOMINAL', 'VIC NOMINAL'
+    if mode and timeliness:
+        acquisition_type = f"{mode} {timeliness}"
+    else:
+        acquisition_type = mode or timeliness  # fallback
+
+    coord_text = coords_el.text.strip()
+    points = []
+    for triplet in coord_text.replace("\n", " ").split():
+        parts = triplet.split(",")
+        if len(parts) < 2:
+            continue
+        lon = float(parts[0])
+        lat = float(parts[1])
+        points.append((lon, lat))
+
+    if len(points) < 3:
+        print(f"Skipping invalid polygon with less than 3 points: {points}")
+        return None
+
+    # Cheap bounding box check on the raw coordinates before building the polygon
+    if point is not None:
+        lons = [lon for lon, _ in points]
+        lats = [lat for _, lat in points]
+        if not (min(lons) <= point.x <= max(lons) and min(lats) <= point.y <= max(lats)):
+            return None
+
+    if points[0] != points[-1]:
+        print("Closing polygon by appending first point to the end.")
+        points.append(points[0])
+
+    poly = Polygon(points)
+    if point is not None and not poly.contains(point):
+        return None
+
+    return {
+        "capture_start": capture_start,
+        "capture_end": capture_end,
+        "polygon": poly,
+        "satellite": satellite,
+        "acquisition_type": acquisition_type,
+    }
+
+
+# Yield one row per placemark of a plan KML without loading the whole tree
+def iter_placemarks(kml, point=None, start=None, end=None):
+    satellite = kml.split("/")[-1].split("_")[0]
+
+    # Keep the chain of open elements so finished placemarks can be detached from their parent,
+    # otherwise the tree keeps growing while we scan and memory is no better than ET.parse
+    parents = []
+    for event, elem in ET.iterparse(kml, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag != PLACEMARK_TAG:
+            continue
+
+        row = parse_placemark(elem, satellite, point, start, end)
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+        if row is not None:
+            yield row
+
+
+def parse_plan_rows(kml, point=None, start=None, end=None):
+    return list(iter_placemarks(kml, point, start, end))
+
+
+def parse_plans(kmls, point=None, start=None, end=None, workers=1):
+    if workers > 1 and len(kmls) > 1:
+        # Files are independent, parse them in separate processes; map keeps the input order
+        with ProcessPoolExecutor(max_workers=min(workers, len(kmls))) as pool:
+            per_file = pool.map(parse_plan_rows, kmls, repeat(point), repeat(start), repeat(end))
+            rows = [row for file_rows in per_file for row in file_rows]
+    else:
+        rows = []
+        for kml in kmls:
+            rows.extend(iter_placemarks(kml, point, start, end))
+
+    # Build the GeoDataFrame once, with "polygon" as the geometry column name
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["capture_start"] = pd.to_datetime(df["capture_start"], format="ISO8601")
+    df["capture_end"] = pd.to_datetime(df["capture_end"], format="ISO8601")
+    return gpd.GeoDataFrame(df, geometry="polygon", crs="EPSG:4326")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # Drop least recently used entries until the cache directory fits in max_bytes
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".parquet"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def load_plan_table(kml, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # The key is the file content, so an edited plan is parsed again and renamed copies are shared.
+    # The satellite comes from the file name, hence it is part of the key too
+    satellite = kml.split("/")[-1].split("_")[0]
+    cache_path = os.path.join(cache_dir, f"{satellite}_{file_digest(kml)}.parquet")
+
+    if os.path.exists(cache_path):
+        os.utime(cache_path)  # mark as recently used for eviction
+        return pd.read_parquet(cache_path)
+
+    # Plain Parquet with WKB geometry: GeoParquet metadata would rebuild the CRS on every read,
+    # which costs more than decoding the table itself
+    df = pd.DataFrame(parse_plans([kml]))
+    df["polygon"] = shapely.to_wkb(df["polygon"].values)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, cache_path)  # atomic, concurrent runs never read a half written file
+    evict_cache(cache_dir, max_bytes)
+    return df
+
+
+def load_plans(kmls, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, workers=1):
+    if workers > 1 and len(kmls) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(kmls))) as pool:
+            tables = list(pool.map(load_plan_table, kmls, repeat(cache_dir), repeat(max_bytes)))
+    else:
+        tables = [load_plan_table(kml, cache_dir, max_bytes) for kml in kmls]
+    if not tables:
+        return parse_plans([])
+    df = pd.concat(tables, ignore_index=True)
+    df["polygon"] = shapely.from_wkb(df["polygon"].values)
+    return gpd.GeoDataFrame(df, geometry="polygon", crs="EPSG:4326")
+
+
+def filter_plans(gdf, pt, start_date, end_date):
+    # Filter to only those acquisitions that cover the point of interest
+    gdf = gdf[gdf.geometry.contains(pt)]
+
+    # Filter to the date range
+    return gdf[(gdf["capture_start"] >= start_date) & (gdf["capture_end"] < end_date)]
+
+
+def main(project, pushdown=True, cache=True, workers=1):
     config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
-    rows = []
 
     pt = Point(config["POINT"][0], config["POINT"][1])
 
+    # Keep the ones in between config["START_DATE"] (at 00:00:00) and config["END_DATE"] (at 23:59:59)
+    start_date = pd.to_datetime(config["START_DATE"])
+    end_date = pd.to_datetime(config["END_DATE"]) + pd.Timedelta(days=1)
+
     kmls = glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml")
 
-    for kml in kmls:
-        satellite = kml.split("/")[-1].split("_")[0]
-
-        tree = ET.parse(kml)
-        root = tree.getroot()
-
-        for pm in root.findall(".//kml:Placemark", ns):
-            # Time information
-            begin_el = pm.find(".//kml:TimeSpan/kml:begin", ns)
-            end_el = pm.find(".//kml:TimeSpan/kml:end", ns)
-            coords_el = pm.find(".//kml:Polygon//kml:coordinates", ns)
-
-            # Skip if any of the pieces are missing
-            if begin_el is None or end_el is None or coords_el is None:
-                continue
-
-            capture_start = pd.to_datetime(begin_el.text.strip())
-            capture_end = pd.to_datetime(end_el.text.strip())
-
-            mode = None
-            timeliness = None
-            for data in pm.findall(".//kml:Data", ns):
-                name = data.attrib.get("name")
-                val_el = data.find("kml:value", ns)
-                if val_el is None or not val_el.text:
-                    continue
-                val = val_el.text.strip()
-                if name == "Mode":
-                    mode = val  # e.g. 'NOBS', 'DARK-O', 'VIC'
-                elif name == "Timeliness":
-                    timeliness = val  # e.g. 'NOMINAL'
-
-            # e.g. 'NOBS NOMINAL', 'DARK-O NOMINAL', 'VIC NOMINAL'
-            if mode and timeliness:
-                acquisition_type = f"{mode} {timeliness}"
-            else:
-                acquisition_type = mode or timeliness  # fallback
-
-            coord_text = coords_el.text.strip()
-            points = []
-            for triplet in coord_text.replace("\n", " ").split():
-                parts = triplet.split(",")
-                if len(parts) < 2:
-                    continue
-                lon = float(parts[0])
-                lat = float(parts[1])
-                points.append((lon, lat))
-
-            if len(points) < 3:
-                print(f"Skipping invalid polygon with less than 3 points: {points}")
-                continue
-
-            if points[0] != points[-1]:
-                print("Closing polygon by appending first point to the end.")
-                points.append(points[0])
-
-            poly = Polygon(points)
-
-            rows.append(
-                {
-                    "capture_start": capture_start,
-                    "capture_end": capture_end,
-                    "polygon": poly,
-                    "satellite": satellite,
-                    "acquisition_type": acquisition_type,
-                }
-            )
-
-        # Build GeoDataFrame; use "polygon" as the geometry column name
-        gdf = gpd.GeoDataFrame(rows, geometry="polygon", crs="EPSG:4326")
+    # The cache holds every placemark of a plan file, so it only serves the pushdown path: without pushdown the
+    # plans are always parsed in full and filtered afterwards
+    if not pushdown:
+        return filter_plans(parse_plans(kmls, workers=workers), pt, start_date, end_date)
+    if cache:
+        return filter_plans(load_plans(kmls, workers=workers), pt, start_date, end_date)
+    return parse_plans(kmls, pt, start_date.isoformat(), end_date.isoformat(), workers=workers)
 
-    # Filter to only those acquisitions that cover the point of interest
-    gdf = gdf[gdf.geometry.apply(lambda geom: geom.contains(pt))]
 
-    # Filter to the ones in between config["START_DATE"] (at 00:00:00) and config["END_DATE"] (at 23:59:59)
+def load_sites(sites):
+    # Accepts a vector file (e.g. an AOI polygon.geojson), a GeoDataFrame/GeoSeries, or an iterable of
+    # (lon, lat) pairs / shapely geometries / GeoJSON geometry dicts. Returns a GeoDataFrame in EPSG:4326
+    if isinstance(sites, str):
+        sites = gpd.read_file(sites)
+    if isinstance(sites, gpd.GeoSeries):
+        sites = gpd.GeoDataFrame(geometry=sites)
+    if isinstance(sites, gpd.GeoDataFrame):
+        return sites.to_crs("EPSG:4326") if sites.crs is not None else sites.set_crs("EPSG:4326")
+
+    geoms = []
+    for site in sites:
+        if isinstance(site, BaseGeometry):
+            geoms.append(site)
+        elif isinstance(site, dict):
+            geoms.append(shape(site))
+        else:
+            geoms.append(Point(site[0], site[1]))
+    return gpd.GeoDataFrame(geometry=geoms, crs="EPSG:4326")
+
+
+def match_sites(gdf, sites, predicate="within"):
+    # One spatial index query for all sites instead of a containment test per polygon and site.
+    # "within" keeps swaths that fully cover the site, "intersects" also keeps partial AOI coverage
+    sites = load_sites(sites)
+    site_idx, plan_idx = gdf.sindex.query(sites.geometry, predicate=predicate)
+
+    # Sort by site, then by acquisition, so results read the same way as the single point query
+    order = np.lexsort((plan_idx, site_idx))
+    site_idx, plan_idx = site_idx[order], plan_idx[order]
+
+    matches = pd.DataFrame(gdf.drop(columns=gdf.geometry.name).iloc[plan_idx]).reset_index(names="plan_index")
+    matches.insert(0, "site", sites.index[site_idx])
+    return matches
+
+
+def match_project_sites(project, sites, predicate="within", cache=True, workers=1):
+    config = json.load(open(f"acquisition_forecaster/projects/{project}/input/config.json"))
     start_date = pd.to_datetime(config["START_DATE"])
     end_date = pd.to_datetime(config["END_DATE"]) + pd.Timedelta(days=1)
-    gdf = gdf[(gdf["capture_start"] >= start_date) & (gdf["capture_end"] < end_date)]
-    return gdf
+
+    kmls = glob.glob(f"acquisition_forecaster/projects/{project}/input/sentinel_plans/*.kml")
+    if cache:
+        gdf = load_plans(kmls, workers=workers)
+        gdf = gdf[(gdf["capture_start"] >= start_date) & (gdf["capture_end"] < end_date)]
+    else:
+        gdf = parse_plans(kmls, start=start_date.isoformat(), end=end_date.isoformat(), workers=workers)
+    return match_sites(gdf, sites, predicate)
+
+
+def add_arguments(parser):
+    # Options of this module's CLI, shared with `python -m acquisition_forecaster plans`
+    parser.add_argument("--project", type=str, required=True, help="Project name")
+    parser.add_argument("--no-pushdown", action="store_true",
+                        help="Parse every placemark and filter afterwards instead of while scanning (skips the"
+                             " cache)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Parse the plan KMLs instead of loading them from {CACHE_DIR}")
+    parser.add_argument("--sites", type=str,
+                        help="Vector file with the sites (points or AOI polygons) to match instead of the config POINT")
+    parser.add_argument("--predicate", type=str, choices=["within", "intersects"], default="within",
+                        help="Site/swath relation used with --sites")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to parse the plan files")
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Parse Sentinel acquisition KML to GeoDataFrame and filter by"
                                                  " point and date range")
-    parser.add_argument("--project", type=str, required=True, help="Project name")
+    add_arguments(parser)
     args = parser.parse_args()
-    gdf = main(args.project)
-    print(gdf)
+    if args.sites:
+        print(match_project_sites(args.project, args.sites, args.predicate, cache=not args.no_cache,
+                                  workers=args.workers))
+    else:
+        gdf = main(args.project, pushdown=not args.no_pushdown, cache=not args.no_cache, workers=args.workers)
+        print(gdf)
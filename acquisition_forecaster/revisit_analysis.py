@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SECONDS_PER_DAY = 86400
+PERCENTILES = (5, 50, 95)
+
+
+def group_keys(by):
+    # Optional grouping columns on top of the satellite, e.g. "site" for multi-site catalogues
+    if by is None:
+        return []
+    return [by] if isinstance(by, str) else list(by)
+
+
+def revisit_table(records, by=None):
+    # One row per acquisition with typed columns: categorical satellite and day of week, float32 hours and gaps.
+    # days_since_last is the gap to the previous acquisition of any satellite (per `by` group),
+    # days_since_last_satellite the gap to the previous one of the same satellite, also spread into one
+    # days_since_last_<satellite> column per satellite found in the data
+    keys = group_keys(by)
+    moments = records["datetime"]
+    order = np.lexsort([moments.values] + [pd.factorize(records[key], sort=True)[0] for key in reversed(keys)])
+    moments = moments.iloc[order]
+    df = pd.DataFrame({key: records[key].values[order] for key in keys})
+    df["satellite"] = pd.Categorical(records["satellite"].values[order])
+    df["datetime"] = moments.array
+    df["day_of_week"] = pd.Categorical.from_codes(moments.dt.dayofweek.values, categories=DAYS_OF_WEEK, ordered=True)
+    df["hour"] = (moments.dt.hour.values + moments.dt.minute.values / 60).astype("float32")
+    df.index = records.index[order]
+
+    # Rows are sorted by group then time, so a group's gaps are plain differences masked at group boundaries
+    seconds = moments.values.astype("datetime64[us]").astype("int64") / 1e6
+    overall = np.diff(seconds, prepend=np.nan)
+    if keys:
+        overall[df.groupby(keys, observed=True, sort=False).cumcount().values == 0] = np.nan
+    per_satellite = pd.Series(seconds, index=df.index).groupby(
+        [df[key] for key in keys] + [df["satellite"]], observed=True, sort=False).diff()
+    df["days_since_last"] = (overall / SECONDS_PER_DAY).astype("float32")
+    df["days_since_last_satellite"] = (per_satellite.values / SECONDS_PER_DAY).astype("float32")
+
+    codes = df["satellite"].cat.codes.values
+    for code, satellite in enumerate(df["satellite"].cat.categories):
+        df[f"days_since_last_{satellite.lower()}"] = np.where(
+            codes == code, df["days_since_last_satellite"].values, np.float32(np.nan))
+    return df
+
+
+def satellites(df):
+    return [column.removeprefix("days_since_last_").upper() for column in df.columns
+            if column.startswith("days_since_last_") and column != "days_since_last_satellite"]
+
+
+def revisit_stats(df, by=None, percentiles=PERCENTILES):
+    # Gap statistics per satellite and for all satellites combined ("ALL"), per `by` group
+    keys = group_keys(by)
+    satellite = df["satellite"].cat.add_categories(["ALL"]) if "ALL" not in df["satellite"].cat.categories \
+        else df["satellite"]
+    gaps = pd.DataFrame({key: np.concatenate([df[key].values, df[key].values]) for key in keys})
+    gaps["satellite"] = pd.Categorical.from_codes(
+        np.concatenate([satellite.cat.codes.values, np.full(len(df), satellite.cat.categories.get_loc("ALL"))]),
+        categories=satellite.cat.categories)
+    gaps["days_since_last"] = np.concatenate([df["days_since_last_satellite"].values, df["days_since_last"].values])
+
+    grouped = gaps.dropna().groupby(keys + ["satellite"], observed=True)["days_since_last"]
+    stats = grouped.agg(["count", "mean", "min", "max"])
+    quantiles = grouped.quantile([p / 100 for p in percentiles]).unstack()
+    quantiles.columns = [f"p{p}" for p in percentiles]
+    stats = stats.join(quantiles)
+    return stats[["count", "mean", "min"] + [f"p{p}" for p in percentiles] + ["max"]].reset_index()
+
+
+def rolling_revisit(df, window="90D", by=None):
+    # Median gap over a trailing time window, per satellite and for all satellites combined
+    keys = group_keys(by)
+    indexed = df.set_index("datetime")
+    combined = indexed.groupby(keys, observed=True)["days_since_last"] if keys else indexed["days_since_last"]
+    per_satellite = indexed.groupby(keys + ["satellite"], observed=True)["days_since_last_satellite"]
+
+    rolled = per_satellite.rolling(window).median().rename("rolling_median_days").reset_index()
+    rolled_all = combined.rolling(window).median().rename("rolling_median_days").reset_index()
+    rolled_all["satellite"] = "ALL"
+    return pd.concat([rolled.astype({"satellite": str}), rolled_all], ignore_index=True)
@@ -0,0 +1,244 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import hashlib
+import json
+import os
+import re
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio import Affine
+import shapely
+from shapely.geometry import LineString, MultiLineString
+from skimage.filters import threshold_otsu
+from skimage.measure import find_contours
+
+from coastline_estimator import transects
+from denoising import list_scenes, read_aoi
+import tiling
+
+MIN_SEGMENT_VERTICES = 5  # contours shorter than this are speckle (isolated pixels, small ponds)
+SHORELINE_COLUMNS = ["date", "scene", "key", "threshold", "water_fraction", "length_m", "segments"]
+
+
+def project_dir(project):
+    return f"coastline_estimator/projects/{project}"
+
+
+def load_config(project):
+    path = f"{project_dir(project)}/input/config.json"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_aoi(path):
+    # The first feature of the AOI file, on its own
+    gdf = gpd.read_file(path)
+    return gpd.GeoDataFrame(geometry=[gdf.geometry[0]], crs=gdf.crs)
+
+
+def scene_date(name):
+    # Sensing time from a Sentinel-2 product name (S2B_MSIL2A_20250107T051119_...), else its first 8-digit date
+    match = re.search(r"(\d{8}T\d{6})", name) or re.search(r"(\d{8})", name)
+    return pd.to_datetime(match.group(1), format="%Y%m%dT%H%M%S" if "T" in match.group(1) else "%Y%m%d") \
+        if match else pd.NaT
+
+
+def ndwi(green, nir):
+    # McFeeters NDWI, NaN where both bands are zero (outside the AOI after crop_to_aoi)
+    total = green + nir
+    with np.errstate(invalid="ignore", divide="ignore"):
+        index = (green - nir) / total
+    index[total == 0] = np.nan
+    return index
+
+
+def water_threshold(index):
+    return float(threshold_otsu(index[np.isfinite(index)]))
+
+
+def shoreline_geometry(index, threshold, transform, min_vertices=MIN_SEGMENT_VERTICES):
+    # Land/water boundary as the marching-squares contours of NDWI at the threshold, in the raster CRS. Contours
+    # stop at invalid (outside AOI) pixels instead of running along the AOI edge
+    contours = find_contours(np.nan_to_num(index, nan=threshold), threshold, mask=np.isfinite(index))
+    lines = []
+    for contour in contours:
+        if len(contour) < min_vertices:
+            continue
+        # Contour vertices are (row, col) pixel indices; the affine maps pixel centres (+0.5) to map coordinates
+        xs, ys = transform * (contour[:, 1] + 0.5, contour[:, 0] + 0.5)
+        lines.append(LineString(np.column_stack([xs, ys])))
+    return MultiLineString(lines)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def scene_keys(green_path, nir_path, aoi_gdf, denoising_method):
+    # Cache keys of a scene's AOI crop (band files by path, size and mtime, and the AOI) and of its shoreline
+    # (the crop plus the processing options). Band files are not hashed: a full tile is hundreds of MB
+    crop = hashlib.sha256(json.dumps([file_signature(green_path), file_signature(nir_path),
+                                      aoi_gdf.geometry.iloc[0].wkb_hex, aoi_gdf.crs.to_string()]).encode())
+    return crop.hexdigest(), hashlib.sha256(f"{crop.hexdigest()}_{denoising_method}".encode()).hexdigest()
+
+
+def save_npz(path, **arrays):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_crop(green_path, nir_path, aoi_gdf, cache_path=None):
+    # Green and NIR AOI crops, their transform and CRS, from <cache_path> when a previous run stored them
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return (cached["green"], cached["nir"], Affine(*cached["transform"]),
+                    rasterio.CRS.from_wkt(str(cached["crs"])))
+
+    with rasterio.open(green_path) as gsrc, rasterio.open(nir_path) as nsrc:
+        aoi_proj = aoi_gdf.to_crs(gsrc.crs)
+        green, transform = read_aoi(gsrc, aoi_proj)
+        nir, _ = read_aoi(nsrc, aoi_proj)
+        crs = gsrc.crs
+    if cache_path:
+        save_npz(cache_path, green=green, nir=nir, transform=np.array(transform)[:6], crs=crs.to_wkt())
+    return green, nir, transform, crs
+
+
+def scene_index(green, nir, denoising_method="none"):
+    # NDWI of the AOI crop, filtered with `denoising_method` inside the AOI only
+    index = ndwi(green, nir)
+    if denoising_method != "none":
+        valid = np.isfinite(index)
+        index = tiling.denoise(np.where(valid, index, 0).astype(np.float32), denoising_method)
+        index[~valid] = np.nan
+    return index
+
+
+def scene_shoreline(name, key, index, threshold, shoreline, crs):
+    # The scene's row of the shoreline table and its shoreline as a one-row GeoDataFrame in EPSG:4326
+    valid = np.isfinite(index)
+    row = {
+        "date": scene_date(name),
+        "scene": name,
+        "key": key,
+        "threshold": threshold,
+        "water_fraction": float((index[valid] > threshold).mean()),
+        "length_m": shoreline.length,
+        "segments": len(shoreline.geoms),
+    }
+    return row, gpd.GeoDataFrame([row], geometry=[shoreline], crs=crs).to_crs("EPSG:4326")
+
+
+def process_scene(name, green_path, nir_path, aoi_gdf, denoising_method="none", output_dir=None, cache_dir=None):
+    # One scene: windowed AOI crop of both bands, NDWI, Otsu threshold, shoreline. Writes <output_dir>/<name>.geojson
+    # and returns the scene's row of the shoreline table with its shoreline (EPSG:4326). With `cache_dir` the crop,
+    # NDWI and shoreline are kept per scene key and reused by later runs
+    crop_key, key = scene_keys(green_path, nir_path, aoi_gdf, denoising_method)
+    result_path = os.path.join(cache_dir, f"{key}.npz") if cache_dir else None
+    if result_path and os.path.exists(result_path):
+        with np.load(result_path) as cached:
+            index, threshold = cached["ndwi"], float(cached["threshold"])
+            shoreline = shapely.from_wkb(cached["shoreline"].tobytes())
+            crs = rasterio.CRS.from_wkt(str(cached["crs"]))
+    else:
+        green, nir, transform, crs = load_crop(green_path, nir_path, aoi_gdf,
+                                               os.path.join(cache_dir, f"{crop_key}.npz") if cache_dir else None)
+        index = scene_index(green, nir, denoising_method)
+        threshold = water_threshold(index)
+        shoreline = shoreline_geometry(index, threshold, transform)
+        if result_path:
+            save_npz(result_path, ndwi=index, threshold=threshold, crs=crs.to_wkt(),
+                     shoreline=np.frombuffer(shapely.to_wkb(shoreline), dtype=np.uint8))
+
+    row, gdf = scene_shoreline(name, key, index, threshold, shoreline, crs)
+    if output_dir is not None:
+        gdf.astype({"date": str}).to_file(os.path.join(output_dir, f"{name}.geojson"), driver="GeoJSON")
+    return row, gdf.geometry.iloc[0]
+
+
+def process_scenes(scenes, aoi_gdf, denoising_method="none", output_dir=None, workers=1, cache_dir=None):
+    # Shoreline table of a time series, one scene per task across `workers` processes, sorted by date, and the
+    # shorelines (EPSG:4326) by scene key
+    names, greens, nirs = zip(*scenes) if scenes else ((), (), ())
+    args = (names, greens, nirs, repeat(aoi_gdf), repeat(denoising_method), repeat(output_dir), repeat(cache_dir))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process_scene, *args))
+    else:
+        results = list(map(process_scene, *args))
+
+    table = pd.DataFrame([row for row, _ in results], columns=SHORELINE_COLUMNS)
+    shorelines = gpd.GeoDataFrame({"key": table["key"]}, geometry=[line for _, line in results], crs="EPSG:4326")
+    return table.sort_values(["date", "scene"], ignore_index=True), shorelines
+
+
+def write_series(output, table, positions):
+    # The shoreline table, the transect positions in table order and their change statistics
+    table.to_csv(f"{output}/shorelines.csv", index=False)
+    positions = positions.reindex(table["key"])
+    positions.to_csv(f"{output}/transect_positions.csv")
+    if len(table):
+        transects.change_stats(positions, table["date"]).to_csv(f"{output}/transect_stats.csv", index=False)
+
+
+def main(project, scenes=None, denoising_method="none", workers=1, incremental=True):
+    # Scenes default to input/scenes/*_green.tif (or the config's "SCENES" glob, relative to the project input).
+    # Writes output/shorelines/<scene>.geojson, the per-date table output/shorelines.csv, the shoreline position on
+    # every transect (output/transects.geojson) in output/transect_positions.csv and their change statistics in
+    # output/transect_stats.csv. Incremental runs only process scenes whose key is not in the previous table
+    config = load_config(project)
+    pattern = scenes or os.path.join(project_dir(project), "input", config.get("SCENES", "scenes/*_green.tif"))
+    aoi_gdf = load_aoi(f"{project_dir(project)}/input/polygon.geojson")
+
+    output = f"{project_dir(project)}/output"
+    cache_dir = f"{output}/cache"
+    os.makedirs(f"{output}/shorelines", exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    table_path, positions_path = f"{output}/shorelines.csv", f"{output}/transect_positions.csv"
+
+    listed = list_scenes(pattern)
+    keys = [scene_keys(green_path, nir_path, aoi_gdf, denoising_method)[1] for _, green_path, nir_path in listed]
+    previous = pd.DataFrame(columns=SHORELINE_COLUMNS)
+    positions = None
+    if incremental and os.path.exists(table_path) and os.path.exists(positions_path):
+        previous = pd.read_csv(table_path, parse_dates=["date"])
+        previous = previous[previous["key"].isin(keys)]
+        positions = pd.read_csv(positions_path, index_col="key")
+    new_scenes = [scene for scene, key in zip(listed, keys) if key not in set(previous["key"])]
+
+    new_table, shorelines = process_scenes(new_scenes, aoi_gdf, denoising_method, f"{output}/shorelines", workers,
+                                           cache_dir)
+    table = pd.concat([df for df in (previous, new_table) if not df.empty] or [new_table])
+    table = table.sort_values(["date", "scene"], ignore_index=True)
+
+    transect_lines = transects.load_transects(f"{output}/transects.geojson", aoi_gdf)
+    new_positions = transects.shoreline_positions(transect_lines, shorelines)
+    positions = pd.concat([positions, new_positions]) if positions is not None else new_positions
+    write_series(output, table, positions)
+
+    print(f"{len(new_scenes)} new scene(s) processed, {len(previous)} from the previous run")
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract the shoreline of every scene of a coastline project")
+    parser.add_argument("--project", type=str, required=True, help="Project name")
+    parser.add_argument("--scenes", type=str, default=None,
+                        help="Glob of *_green.tif bands, quoted (default: the project's input/scenes)")
+    parser.add_argument("--denoising-method", type=str, choices=["none", "boxcar_4x4", "bilateral"], default="none",
+                        help="Filter applied to the NDWI before thresholding")
+    parser.add_argument("--workers", type=int, default=1, help="Scenes processed in parallel")
+    parser.add_argument("--full", action="store_true", help="Process every scene again instead of only new ones")
+    args = parser.parse_args()
+
+    table = main(args.project, args.scenes, args.denoising_method, args.workers, incremental=not args.full)
+    print(table.drop(columns="key").to_string(index=False))
@@ -0,0 +1,87 @@
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import LineString
+
+TRANSECT_SPACING_M = 50
+DAYS_PER_YEAR = 365.25
+
+# Shore-normal transects across the AOI and the shoreline position on each of them per scene (distance in metres
+# from the transect start to the nearest crossing), from which DSAS-style change statistics are computed
+
+
+def build_transects(aoi_gdf, spacing=TRANSECT_SPACING_M):
+    # Transects every `spacing` metres along the long axis of the AOI's minimum rotated rectangle, each spanning
+    # the rectangle across, in the AOI's UTM zone
+    crs = aoi_gdf.estimate_utm_crs()
+    rectangle = aoi_gdf.to_crs(crs).geometry.iloc[0].minimum_rotated_rectangle
+    corners = np.asarray(rectangle.exterior.coords)[:4]
+    sides = np.diff(np.vstack([corners, corners[:1]]), axis=0)
+    # Transects start on the longer of the first two sides and run across to the opposite one
+    if np.hypot(*sides[0]) >= np.hypot(*sides[1]):
+        origin, long_side, short_side = corners[0], sides[0], sides[1]
+    else:
+        origin, long_side, short_side = corners[1], sides[1], -sides[0]
+
+    length = np.hypot(*long_side)
+    offsets = np.arange(spacing / 2, length, spacing)
+    starts = origin + np.outer(offsets / length, long_side)
+    lines = [LineString([start, start + short_side]) for start in starts]
+    return gpd.GeoDataFrame({"transect": np.arange(len(lines))}, geometry=lines, crs=crs)
+
+
+def load_transects(path, aoi_gdf, spacing=TRANSECT_SPACING_M):
+    # Transects are built once per project and reused, so positions from different runs stay comparable
+    if os.path.exists(path):
+        return gpd.read_file(path)
+    transects = build_transects(aoi_gdf, spacing)
+    transects.to_file(path, driver="GeoJSON")
+    return transects
+
+
+def shoreline_positions(transects, shorelines):
+    # (scene x transect) distances from each transect start to its nearest crossing with the scene's shoreline,
+    # NaN where they do not cross. `shorelines` is a GeoDataFrame with a "key" column
+    lines = transects.geometry.values
+    shorelines = shorelines.to_crs(transects.crs)
+    positions = np.full((len(shorelines), len(lines)), np.nan)
+    for i, shoreline in enumerate(shorelines.geometry.values):
+        crossings, index = shapely.get_parts(shapely.intersection(lines, shoreline), return_index=True)
+        is_point = shapely.get_type_id(crossings) == 0
+        distances = shapely.line_locate_point(lines[index[is_point]], crossings[is_point])
+        np.fmin.at(positions[i], index[is_point], distances)
+    return pd.DataFrame(positions, index=pd.Index(shorelines["key"], name="key"),
+                        columns=[str(t) for t in transects["transect"]])
+
+
+def change_stats(positions, dates):
+    # Per transect: number of crossings, net shoreline movement (last - first), shoreline change envelope (max - min)
+    # and the linear regression rate in m/year, all vectorized over transects with missing crossings ignored
+    values = positions.to_numpy()
+    years = ((pd.to_datetime(dates) - pd.to_datetime(dates).min()).dt.total_seconds() / 86400 / DAYS_PER_YEAR)
+    t = np.broadcast_to(years.to_numpy()[:, None], values.shape)
+    valid = np.isfinite(values)
+    n = valid.sum(axis=0)
+
+    y = np.where(valid, values, 0.0)
+    tv = np.where(valid, t, 0.0)
+    st, sy = tv.sum(axis=0), y.sum(axis=0)
+    stt, sty = (tv * tv).sum(axis=0), (tv * y).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = (n * sty - st * sy) / (n * stt - st ** 2)
+
+    ordered = values[np.argsort(years.to_numpy(), kind="stable")]
+    columns = np.arange(values.shape[1])
+    first = ordered[np.argmax(np.isfinite(ordered), axis=0), columns]
+    last = ordered[len(ordered) - 1 - np.argmax(np.isfinite(ordered[::-1]), axis=0), columns]
+    envelope = np.fmax.reduce(values, axis=0) - np.fmin.reduce(values, axis=0)  # fmax/fmin skip NaN
+    return pd.DataFrame({
+        "transect": positions.columns.astype(int),
+        "count": n,
+        "nsm_m": last - first,
+        "sce_m": envelope,
+        "lrr_m_per_year": np.where(n >= 2, rate, np.nan),
+    })
@@ -1,16 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import glob
+import math
+import os
+import time
+
 import rasterio
+from rasterio import Affine
 from rasterio.features import geometry_mask
+from rasterio.windows import Window, from_bounds
 import numpy as np
-from scipy.ndimage import uniform_filter
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from skimage.restoration import denoise_bilateral
-
 
-def normalize_image(img):
-    p2, p98 = np.percentile(img,  (2, 98))
-    img_stretched = np.clip(img, p2, p98)
-    return (img_stretched - p2) / (p98 - p2)
+from normalization import normalize_image, series_limits
+import tiling
 
 
 def show_green_nir(green, nir, green_filt, nir_filt):
@@ -30,49 +34,156 @@ def show_green_nir(green, nir, green_filt, nir_filt):
 
 
 def crop_to_aoi(image, aoi_proj, transform):
+    masked_image = mask_to_aoi(image, aoi_proj, transform)
+    rows, cols = crop_slices(masked_image)
+    return masked_image[rows, cols]
+
+
+def mask_to_aoi(image, aoi_proj, transform):
     mask = geometry_mask(
         [geom for geom in aoi_proj.geometry],
         transform=transform,
         invert=True,  # invert=True means mask is True *inside* polygon
         out_shape=image.shape,
     )
-    masked_image = np.where(mask, image, 0)
+    return np.where(mask, image, 0)
+
+
+def crop_slices(masked_image):
+    # Bounding box of the non-zero pixels
     rows = np.any(masked_image != 0, axis=1)
     cols = np.any(masked_image != 0, axis=0)
 
     row_min, row_max = np.where(rows)[0][[0, -1]]
     col_min, col_max = np.where(cols)[0][[0, -1]]
 
-    return masked_image[row_min:row_max+1, col_min:col_max+1]
+    return slice(row_min, row_max+1), slice(col_min, col_max+1)
+
 
+def aoi_window(aoi_proj, src):
+    # Pixel window covering the projected AOI bounds (rounded outwards, one pixel of margin), clipped to the scene
+    bounds = from_bounds(*aoi_proj.total_bounds, transform=src.transform)
+    col_off = math.floor(bounds.col_off) - 1
+    row_off = math.floor(bounds.row_off) - 1
+    window = Window(col_off, row_off,
+                    math.ceil(bounds.col_off + bounds.width) + 1 - col_off,
+                    math.ceil(bounds.row_off + bounds.height) + 1 - row_off)
+    return window.intersection(Window(0, 0, src.width, src.height))
 
-def main(green_path, nir_path, aoi_path, denoising_methid):
+
+def read_aoi(src, aoi_proj, band=1):
+    # Read only the pixels around the AOI instead of the whole band, then crop as crop_to_aoi does on the full scene.
+    # Returns the crop and its affine transform
+    window = aoi_window(aoi_proj, src)
+    transform = src.window_transform(window)
+    masked_image = mask_to_aoi(src.read(band, window=window).astype(np.float32), aoi_proj, transform)
+    rows, cols = crop_slices(masked_image)
+    return masked_image[rows, cols], transform * Affine.translation(cols.start, rows.start)
+
+
+def main(green_path, nir_path, aoi_path, denoising_methid, workers=1, tile_size=tiling.TILE_SIZE, stretch="exact"):
     gdf = gpd.read_file(aoi_path)
     aoi_gdf = gpd.GeoDataFrame(geometry=[gdf.geometry[0]], crs=gdf.crs)
     with rasterio.open(green_path) as gsrc, rasterio.open(nir_path) as nsrc:
         aoi_proj = aoi_gdf.to_crs(gsrc.crs)
-        green = gsrc.read(1).astype(np.float32)
-        nir = nsrc.read(1).astype(np.float32)
-        green_crop = crop_to_aoi(green, aoi_proj, gsrc.transform)
-        nir_crop = crop_to_aoi(nir, aoi_proj, nsrc.transform)
-
-    green_crop_norm = normalize_image(green_crop)
-    nir_crop_norm = normalize_image(nir_crop)
-
-    if denoising_methid == "boxcar_4x4":
-        green_crop_norm_filter = uniform_filter(green_crop_norm, size=4, mode="reflect")
-        nir_crop_norm_filter = uniform_filter(nir_crop_norm, size=4, mode="reflect")
-    elif denoising_methid == "bilateral":
-        green_crop_norm_filter = denoise_bilateral(
-            green_crop_norm, sigma_color=0.1, sigma_spatial=2, channel_axis=None
-        )
-        nir_crop_norm_filter = denoise_bilateral(
-            nir_crop_norm, sigma_color=0.1, sigma_spatial=2, channel_axis=None
-        )
+        green_crop, _ = read_aoi(gsrc, aoi_proj)
+        nir_crop, _ = read_aoi(nsrc, aoi_proj)
+
+    green_crop_norm = normalize_image(green_crop, method=stretch, inplace=True)
+    nir_crop_norm = normalize_image(nir_crop, method=stretch, inplace=True)
+
+    # boxcar_4x4: 4x4 uniform filter, bilateral: sigma_color=0.1, sigma_spatial=2, filtered tile by tile
+    green_crop_norm_filter = tiling.denoise(green_crop_norm, denoising_methid, tile_size, workers)
+    nir_crop_norm_filter = tiling.denoise(nir_crop_norm, denoising_methid, tile_size, workers)
 
     show_green_nir(green_crop_norm, nir_crop_norm, green_crop_norm_filter, nir_crop_norm_filter)
 
 
+def list_scenes(scenes):
+    # (name, green path, nir path) per scene, from a CSV manifest with green,nir[,name] columns or a glob of green
+    # bands whose NIR band sits next to them with "_nir" in place of "_green"
+    if scenes.endswith(".csv"):
+        with open(scenes, newline="") as f:
+            rows = list(csv.DictReader(f))
+        return [(row.get("name") or scene_name(row["green"]), row["green"], row["nir"]) for row in rows]
+    return [(scene_name(green_path), green_path, green_path.replace("_green", "_nir"))
+            for green_path in sorted(glob.glob(scenes))]
+
+
+def scene_name(green_path):
+    # Scene name shared by the denoising and shoreline outputs: the green band's file name without "_green"
+    return os.path.basename(green_path).replace("_green", "").rsplit(".", 1)[0]
+
+
+def load_scene(green_path, nir_path, aoi_gdf):
+    t0 = time.perf_counter()
+    with rasterio.open(green_path) as gsrc, rasterio.open(nir_path) as nsrc:
+        aoi_proj = aoi_gdf.to_crs(gsrc.crs)
+        green_crop, transform = read_aoi(gsrc, aoi_proj)
+        nir_crop, _ = read_aoi(nsrc, aoi_proj)
+        crs = gsrc.crs
+    return green_crop, nir_crop, transform, crs, time.perf_counter() - t0
+
+
+def write_cog(path, image, transform, crs):
+    with rasterio.open(path, "w", driver="COG", width=image.shape[1], height=image.shape[0], count=1,
+                       dtype=image.dtype, crs=crs, transform=transform, compress="deflate", predictor=3) as dst:
+        dst.write(image, 1)
+
+
+def run_batch(scenes, aoi_path, denoising_method, output_dir, workers=1, tile_size=tiling.TILE_SIZE,
+              stretch="exact", shared_limits=False):
+    # Headless read -> crop -> normalize -> filter -> write over many scenes. The next scene is read in a background
+    # thread while the current one is filtered and written. Per-scene timings go to <output_dir>/timing.csv.
+    # With shared_limits each band is stretched with limits pooled over the whole series instead of per scene
+    gdf = gpd.read_file(aoi_path)
+    aoi_gdf = gpd.GeoDataFrame(geometry=[gdf.geometry[0]], crs=gdf.crs)
+    os.makedirs(output_dir, exist_ok=True)
+    scenes = list_scenes(scenes)
+    timings = []
+
+    t_start = time.perf_counter()
+    limits = [None, None]
+    if shared_limits and scenes:
+        crops = [load_scene(green_path, nir_path, aoi_gdf)[:2] for _, green_path, nir_path in scenes]
+        limits = [series_limits(band_crops) for band_crops in zip(*crops)]
+        del crops
+
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(load_scene, scenes[0][1], scenes[0][2], aoi_gdf) if scenes else None
+        for i, (name, _, _) in enumerate(scenes):
+            t0 = time.perf_counter()
+            green_crop, nir_crop, transform, crs, read_s = pending.result()
+            wait_s = time.perf_counter() - t0
+            if i + 1 < len(scenes):
+                pending = reader.submit(load_scene, scenes[i + 1][1], scenes[i + 1][2], aoi_gdf)
+
+            t0 = time.perf_counter()
+            filtered = [tiling.denoise(normalize_image(crop, band_limits, stretch, inplace=True), denoising_method,
+                                       tile_size, workers)
+                        for crop, band_limits in zip((green_crop, nir_crop), limits)]
+            filter_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for band, image in zip(("green", "nir"), filtered):
+                write_cog(os.path.join(output_dir, f"{name}_{band}_{denoising_method}.tif"), image, transform, crs)
+            write_s = time.perf_counter() - t0
+
+            timings.append({"scene": name, "read_s": read_s, "wait_s": wait_s, "filter_s": filter_s,
+                            "write_s": write_s})
+            print(f"{name}: read {read_s:.2f} s (waited {wait_s:.2f} s), filter {filter_s:.2f} s, "
+                  f"write {write_s:.2f} s")
+
+    elapsed = time.perf_counter() - t_start
+    with open(os.path.join(output_dir, "timing.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["scene", "read_s", "wait_s", "filter_s", "write_s"])
+        writer.writeheader()
+        writer.writerows(timings)
+    if scenes:
+        print(f"{len(scenes)} scenes in {elapsed:.1f} s, {len(scenes) / elapsed * 60:.1f} scenes/min")
+    return timings
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -81,14 +192,12 @@ if __name__ == "__main__":
         "-g",
         "--green",
         type=str,
-        required=True,
         help="Path to the location where the green band is stored as geotiff file",
     )
     parser.add_argument(
         "-n",
         "--nir",
         type=str,
-        required=True,
         help="Path to the location where the nir band is stored as geotiff file",
     )
     parser.add_argument(
@@ -105,6 +214,50 @@ if __name__ == "__main__":
         choices=["none", "boxcar_4x4", "bilateral"],
         required=True,
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Tiles filtered in parallel",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=tiling.TILE_SIZE,
+        help="Side of the tiles the filters run on, in pixels",
+    )
+    parser.add_argument(
+        "-s",
+        "--scenes",
+        type=str,
+        help="Batch mode: CSV manifest (green,nir[,name] columns) or glob of *_green.tif bands, quoted",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        default="denoised",
+        help="Where batch mode writes the filtered Cloud-Optimized GeoTIFFs and timing.csv",
+    )
+    parser.add_argument(
+        "--stretch",
+        type=str,
+        choices=["exact", "histogram", "sample"],
+        default="exact",
+        help="How the 2-98 percentile stretch limits are computed",
+    )
+    parser.add_argument(
+        "--shared-limits",
+        action="store_true",
+        help="Batch mode: stretch every scene with the same limits, pooled over the series",
+    )
     args = parser.parse_args()
 
-    main(args.green, args.nir, args.aoi_path, args.denoising_method)
+    if args.scenes:
+        run_batch(args.scenes, args.aoi_path, args.denoising_method, args.output_dir, args.workers, args.tile_size,
+                  args.stretch, args.shared_limits)
+    elif args.green and args.nir:
+        main(args.green, args.nir, args.aoi_path, args.denoising_method, args.workers, args.tile_size, args.stretch)
+    else:
+        parser.error("either --green and --nir, or --scenes, are required")
@@ -1,10 +1,333 @@
+from datetime import datetime, timezone
+import os
+import threading
+import time
+
 import serial
 
-ser = serial.Serial('/dev/ttyACM0', timeout=1)
+from gnss.ubx_decoder import CHECKSUM_BYTES, HEADER_BYTES, MAX_PAYLOAD, SYNC, checksum
+
+# Each receiver gets a reader thread that drains the serial port into a ring buffer and a writer thread that empties
+# the ring into the current log file in large batches, so disk latency never stalls the port. Files are rotated on
+# age or size, at the start of a UBX frame so every rotated file decodes on its own
+RING_BYTES = 2**24
+WRITE_BYTES = 2**18  # the writer waits for this much data, or FLUSH_SECONDS, before writing
+FLUSH_SECONDS = 1.0
+READ_TIMEOUT = 0.1
+ROTATE_SECONDS = 3600
+ROTATE_BYTES = 2**30
+MAX_HOLD_BYTES = 2**16  # rotation waiting for a frame start gives up after this much non-UBX data
+STATS_SECONDS = 10
+OUTPUT_DIR = "gnss/output/logs"
+
+
+class RingBuffer:
+    # Fixed-size byte ring between one producer and one consumer. A full ring drops the incoming bytes (and counts
+    # them) rather than blocking the reader, as a UART would overrun
+    def __init__(self, capacity=RING_BYTES):
+        self.capacity = capacity
+        self._data = bytearray(capacity)
+        self._start = 0
+        self.size = 0
+        self.dropped = 0
+        self._ready = threading.Condition()
+
+    def write(self, data):
+        with self._ready:
+            n = min(len(data), self.capacity - self.size)
+            self.dropped += len(data) - n
+            end = (self._start + self.size) % self.capacity
+            first = min(n, self.capacity - end)
+            self._data[end:end + first] = data[:first]
+            self._data[:n - first] = data[first:n]
+            self.size += n
+            self._ready.notify()
+        return n
+
+    def read(self, min_bytes=1, timeout=None, max_bytes=None):
+        # Up to max_bytes, waiting up to `timeout` for at least min_bytes (returns what is there on timeout)
+        with self._ready:
+            self._ready.wait_for(lambda: self.size >= min_bytes, timeout)
+            n = min(self.size, max_bytes or self.size)
+            first = min(n, self.capacity - self._start)
+            data = bytes(self._data[self._start:self._start + first]) + bytes(self._data[:n - first])
+            self._start = (self._start + n) % self.capacity
+            self.size -= n
+            return data
 
-with open("output/raw_output.ubx", "wb") as f:
+    def wake(self):
+        with self._ready:
+            self._ready.notify_all()
+
+
+def frame_start(data):
+    # Offset of the first complete, valid UBX frame in `data`, None when none can be confirmed yet (no sync chars,
+    # or a frame that is still incomplete)
+    position = 0
     while True:
-        data = ser.read(100)
+        start = data.find(SYNC, position)
+        if start < 0 or start + HEADER_BYTES > len(data):
+            return None
+        length = int.from_bytes(data[start + 4:start + 6], "little")
+        end = start + HEADER_BYTES + length + CHECKSUM_BYTES
+        if length <= MAX_PAYLOAD:
+            if end > len(data):
+                return None
+            if checksum(data[start + 2:end - 2]) == (data[end - 2], data[end - 1]):
+                return start
+        position = start + 1
+
+
+class ReceiverLogger:
+    # Logs one serial receiver to <output_dir>/<name>_<UTC start time>.ubx, rotating after rotate_seconds or
+    # rotate_bytes. Counters: bytes read, written and dropped, reads (syscalls) and files
+    def __init__(self, port, name=None, baudrate=9600, output_dir=OUTPUT_DIR, rotate_seconds=ROTATE_SECONDS,
+                 rotate_bytes=ROTATE_BYTES, ring_bytes=RING_BYTES, write_bytes=WRITE_BYTES,
+                 flush_seconds=FLUSH_SECONDS):
+        self.port = port
+        self.name = name or os.path.basename(port)
+        self.baudrate = baudrate
+        self.output_dir = output_dir
+        self.rotate_seconds = rotate_seconds
+        self.rotate_bytes = rotate_bytes
+        self.write_bytes = write_bytes
+        self.flush_seconds = flush_seconds
+        self.ring = RingBuffer(ring_bytes)
+        self.bytes_read = self.bytes_written = self.reads = 0
+        self.files = []
+        self._file = None
+        self._opened = self._file_bytes = 0
+        self._stop = threading.Event()
+        self._threads = []
+        self.started = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._serial = serial.Serial(self.port, self.baudrate, timeout=READ_TIMEOUT)
+        self.started = time.monotonic()
+        self._threads = [threading.Thread(target=self._read_loop, name=f"{self.name}-reader", daemon=True),
+                         threading.Thread(target=self._write_loop, name=f"{self.name}-writer", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        # Stop reading, then let the writer drain the ring and close the file. Nothing to do if never started
+        if not self._threads:
+            return
+        self._stop.set()
+        self._threads[0].join()
+        self.ring.wake()
+        self._threads[1].join()
+        self._serial.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {"name": self.name, "bytes_read": self.bytes_read, "bytes_written": self.bytes_written,
+                "bytes_dropped": self.ring.dropped, "buffered": self.ring.size, "reads": self.reads,
+                "files": len(self.files), "read_rate_kbs": self.bytes_read / elapsed / 1000 if elapsed else 0.0}
+
+    def _read_loop(self):
+        # Whatever the port holds in one read call, blocking for at most READ_TIMEOUT when it is empty
+        while not self._stop.is_set():
+            data = self._serial.read(self._serial.in_waiting or 1)
+            if data:
+                self.reads += 1
+                self.bytes_read += len(data)
+                self.ring.write(data)
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        path = os.path.join(self.output_dir, f"{self.name}_{stamp}.ubx")
+        self._file = open(path, "wb")
+        self.files.append(path)
+        self._opened, self._file_bytes = time.monotonic(), 0
+
+    def _write(self, data):
         if data:
-            f.write(data)
+            self._file.write(data)
+            self._file.flush()
+            self._file_bytes += len(data)
+            self.bytes_written += len(data)
+
+    def _rotation_due(self):
+        return (self._file_bytes >= self.rotate_bytes or
+                time.monotonic() - self._opened >= self.rotate_seconds)
+
+    def _write_loop(self):
+        # Bytes of a due rotation are held back until a frame start is confirmed, so the new file begins with it
+        self._open()
+        held = b""
+        while True:
+            stopping = self._stop.is_set()
+            data = held + self.ring.read(0 if stopping else self.write_bytes, self.flush_seconds)
+            held = b""
+            if self._rotation_due() and data:
+                split = frame_start(data)
+                if split is None and len(data) < MAX_HOLD_BYTES and not stopping:
+                    held = data
+                    continue
+                split = len(data) if split is None else split
+                self._write(data[:split])
+                self._open()
+                data = data[split:]
+            self._write(data)
+            if stopping and not self.ring.size:
+                break
+        self._file.close()
+
+
+def run(receivers, stats_seconds=STATS_SECONDS):
+    # Log every receiver until interrupted, printing their counters every stats_seconds
+    try:
+        for receiver in receivers:
+            receiver.start()
+        while True:
+            time.sleep(stats_seconds)
+            for receiver in receivers:
+                s = receiver.stats()
+                print(f"{s['name']}: {s['bytes_read']} B read ({s['read_rate_kbs']:.1f} kB/s), "
+                      f"{s['bytes_written']} written, {s['bytes_dropped']} dropped, {s['files']} file(s)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for receiver in receivers:
+            receiver.stop()
+
+
+class FakeReceiver:
+    # A pseudo-terminal replaying a log, for testing without hardware: open `.port` like a serial device. The log is
+    # paced at baudrate (10 bits per byte), or sent as fast as the pty accepts with baudrate=None
+    def __init__(self, source, baudrate=None, repeat=1, chunk_bytes=4096):
+        import tty
+        with open(source, "rb") as f:
+            self.data = f.read() * repeat
+        self.baudrate = baudrate
+        self.chunk_bytes = chunk_bytes
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._thread = threading.Thread(target=self._send, daemon=True)
+
+    def _send(self):
+        t0 = time.perf_counter()
+        view = memoryview(self.data)
+        for offset in range(0, len(view), self.chunk_bytes):
+            if self.baudrate:
+                delay = t0 + offset * 10 / self.baudrate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            chunk = view[offset:offset + self.chunk_bytes]
+            while len(chunk):
+                chunk = chunk[os.write(self._master, chunk):]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def join(self):
+        self._thread.join()
+
+    def close(self):
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self._thread.join()
+        self.close()
+
+
+def legacy_log(port, path, total_bytes, baudrate=9600):
+    # Baseline: the former logger loop, 100-byte reads each written straight to the file
+    with serial.Serial(port, baudrate, timeout=1) as ser, open(path, "wb") as f:
+        received = reads = 0
+        while received < total_bytes:
+            data = ser.read(100)
+            if data:
+                f.write(data)
+                received += len(data)
+                reads += 1
+    return reads
+
+
+def wait_for(receiver, total_bytes, timeout=600):
+    deadline = time.monotonic() + timeout
+    while receiver.bytes_read + receiver.ring.dropped < total_bytes and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def benchmark(source, baudrate=None, repeat=20, receivers=1, output_dir="/tmp/gnss_logger_benchmark"):
+    # Replays `source` through pty receivers: the former loop against the ring-buffered logger (rotating every
+    # 1 MB), checking that the rotated files concatenate to the input and each starts on a frame
+    import shutil
+    from gnss.ubx_decoder import iter_frames
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    size = os.path.getsize(source) * repeat
+    print(f"Logging {receivers} pty receiver(s) replaying {source} x{repeat} ({size / 2**20:.1f} MB each) at "
+          f"{f'{baudrate} baud' if baudrate else 'full speed'}")
+
+    with FakeReceiver(source, baudrate, repeat) as fake:
+        t0 = time.perf_counter()
+        reads = legacy_log(fake.port, os.path.join(output_dir, "legacy.ubx"), size)
+        seconds = time.perf_counter() - t0
+    print(f"  {'legacy':<8} {seconds:7.2f} s  {size / 2**20 / seconds:7.1f} MB/s  {reads} reads")
+
+    fakes = [FakeReceiver(source, baudrate, repeat) for _ in range(receivers)]
+    loggers = [ReceiverLogger(fake.port, f"receiver{i}", output_dir=output_dir, rotate_bytes=2**20)
+               for i, fake in enumerate(fakes)]
+    for logger in loggers:
+        logger.start()
+    t0 = time.perf_counter()
+    for fake in fakes:
+        fake.start()
+    for logger in loggers:
+        wait_for(logger, size)
+    seconds = time.perf_counter() - t0
+    for fake, logger in zip(fakes, loggers):
+        logger.stop()
+        fake.join()
+        fake.close()
+        s = logger.stats()
+        logged = b"".join(open(path, "rb").read() for path in logger.files)
+        aligned = all(open(path, "rb").read(2) in (SYNC, b"") for path in logger.files[1:])
+        with open(logger.files[-1], "rb") as f:
+            decodes = sum(1 for _ in iter_frames(f)) > 0
+        print(f"  {s['name']:<8} {seconds:7.2f} s  {size / 2**20 / seconds:7.1f} MB/s  {s['reads']} reads, "
+              f"{s['bytes_dropped']} dropped, {s['files']} files, identical: {logged == fake.data}, "
+              f"frame aligned: {aligned and decodes}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Log the raw output of one or more u-blox receivers")
+    parser.add_argument("--port", type=str, nargs="+", default=["/dev/ttyACM0"],
+                        help="Serial ports, each optionally named as PORT=NAME (default name: the port's)")
+    parser.add_argument("--baudrate", type=int, default=9600, help="Serial baud rate")
+    parser.add_argument("--output-dir", type=str, default=OUTPUT_DIR, help="Directory of the log files")
+    parser.add_argument("--rotate-minutes", type=float, default=ROTATE_SECONDS / 60, help="Start a new file after")
+    parser.add_argument("--rotate-mb", type=float, default=ROTATE_BYTES / 2**20, help="Start a new file above")
+    parser.add_argument("--benchmark", type=str, default=None, metavar="UBX_LOG",
+                        help="Replay this log through pty receivers instead of logging (--baudrate 0: full speed)")
+    parser.add_argument("--receivers", type=int, default=1, help="Concurrent pty receivers of the benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Times the benchmark replays the log")
+    args = parser.parse_args()
 
+    if args.benchmark:
+        benchmark(args.benchmark, args.baudrate or None, args.repeat, args.receivers)
+    else:
+        run([ReceiverLogger(port, name or None, args.baudrate, args.output_dir, args.rotate_minutes * 60,
+                            int(args.rotate_mb * 2**20))
+             for port, _, name in (spec.partition("=") for spec in args.port)])
@@ -0,0 +1,295 @@
+import mmap
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# RINEX 3 observation files: a header of 80-column labelled lines, then per epoch a "> yyyy mm dd hh mm ss.sssssss
+# flag nsat" line followed by one line per satellite: "Gnn" and, for each observation type of that system, a
+# F14.3 value with one-digit loss-of-lock and signal-strength indicators (16 columns per observation)
+OBS_WIDTH = 16
+VALUE_WIDTH = 14
+DECIMALS = 3
+SCAN_BYTES = 2**24  # epoch lines are located block by block, bounding the scan's temporaries
+EPOCH_BLOCK = 128  # epochs decoded at a time, bounding the decoder's per-byte temporaries
+
+
+class ObsHeader:
+    def __init__(self, version, obs_types, data_offset, attrs):
+        self.version = version
+        self.obs_types = obs_types  # system letter -> list of observation codes, in record order
+        self.data_offset = data_offset
+        self.attrs = attrs
+
+
+def read_header(buffer):
+    # Header lines up to END OF HEADER, labels in columns 61-80
+    obs_types, attrs = {}, {}
+    version, offset, system = None, 0, None
+    while True:
+        end = buffer.find(b"\n", offset)
+        line = bytes(buffer[offset:end if end >= 0 else len(buffer)]).decode("ascii", "replace")
+        offset = end + 1
+        label = line[60:].strip()
+        if label == "RINEX VERSION / TYPE":
+            version = float(line[:9])
+            attrs["system"] = line[40:41]
+        elif label == "SYS / # / OBS TYPES":
+            if line[0] != " ":  # continuation lines leave the system blank
+                system = line[0]
+                obs_types[system] = []
+            obs_types[system] += line[7:60].split()
+        elif label == "INTERVAL":
+            attrs["interval"] = float(line[:10])
+        elif label in ("MARKER NAME", "REC # / TYPE / VERS", "ANT # / TYPE"):
+            attrs[label.split(" ")[0].lower()] = line[:60].strip()
+        elif label == "APPROX POSITION XYZ":
+            attrs["position"] = [float(v) for v in line[:42].split()]
+        elif label == "TIME OF FIRST OBS":
+            attrs["time_system"] = line[48:51].strip() or "GPS"
+        if label == "END OF HEADER" or end < 0:
+            break
+    if version is None or version < 3:
+        raise ValueError(f"Not a RINEX 3 observation file (version {version})")
+    return ObsHeader(version, obs_types, offset, attrs)
+
+
+def line_bounds(buffer, start, end):
+    # Start and end (exclusive, without \r\n) offsets of the lines in buffer[start:end]
+    newlines = np.flatnonzero(buffer[start:end] == ord("\n")) + start
+    starts = np.concatenate([[start], newlines + 1])
+    ends = np.concatenate([newlines, [end]])
+    keep = starts < ends
+    starts, ends = starts[keep], ends[keep]
+    ends = ends - (buffer[np.maximum(ends - 1, 0)] == ord("\r"))
+    return starts, ends
+
+
+def line_grid(buffer, starts, ends, width):
+    # Lines as a (lines x width) uint8 array padded with spaces: RINEX drops trailing blanks, so records have varying
+    # lengths. Filled with one fancy-indexing copy, no per-line loop
+    lengths = np.minimum(ends - starts, width)
+    grid = np.full((len(starts), width), ord(" "), dtype=np.uint8)
+    total = int(lengths.sum())
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    cols = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    grid[rows, cols] = buffer[np.repeat(starts, lengths) + cols]
+    return grid
+
+
+def fixed_int(grid, start, stop):
+    # Unsigned/signed integer in fixed columns, blanks ignored
+    field = grid[:, start:stop]
+    digits = np.where((field >= ord("0")) & (field <= ord("9")), field - ord("0"), 0).astype(np.int64)
+    is_digit = (field >= ord("0")) & (field <= ord("9"))
+    # Digits are right-aligned; weight each by its position from the right among the digit columns
+    weights = 10 ** np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] // 10
+    value = (digits * weights).sum(axis=1)
+    return np.where((field == ord("-")).any(axis=1), -value, value)
+
+
+def fixed_decimal(grid, start, width, decimals):
+    # F<width>.<decimals> values as integers of 10^-decimals units and a mask of blank fields
+    field = grid[:, start:start + width]
+    blank = (field == ord(" ")).all(axis=1)
+    point = width - decimals - 1
+    units = fixed_int(np.concatenate([field[:, :point], field[:, point + 1:]], axis=1), 0, width - 1)
+    return units, blank
+
+
+def epoch_lines(buffer, start, end):
+    # Offsets of the epoch lines (starting with ">") in buffer[start:end], scanned a block at a time
+    found = []
+    for block in range(start, end, SCAN_BYTES):
+        stop = min(block + SCAN_BYTES, end)
+        marks = np.flatnonzero(buffer[block:stop] == ord(">")) + block
+        marks = marks[(marks == start) | (buffer[np.maximum(marks - 1, 0)] == ord("\n"))]
+        found.append(marks)
+    return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+def epoch_records(buffer, offsets):
+    # Time (datetime64[ns]), flag and satellite count of the epoch lines at `offsets`
+    grid = line_grid(buffer, offsets, np.minimum(offsets + 35, len(buffer)), 35)  # the count ends in column 35
+    seconds = fixed_decimal(grid, 18, 11, 7)[0]
+    times = pd.to_datetime(pd.DataFrame({
+        "year": fixed_int(grid, 2, 6), "month": fixed_int(grid, 7, 9), "day": fixed_int(grid, 10, 12),
+        "hour": fixed_int(grid, 13, 15), "minute": fixed_int(grid, 16, 18)})).to_numpy()
+    times = times + (seconds * 100).astype("timedelta64[ns]")
+    return times, fixed_int(grid, 31, 32), fixed_int(grid, 32, 35)
+
+
+def decode_records(buffer, header, start, end, indicators=False):
+    # Observation records of the epochs in buffer[start:end]: the times and satellites (sorted "Gnn" bytes) of the
+    # observation epochs and a time x sv array per observation code (and <code>_lli / <code>_ssi with indicators)
+    starts, ends = line_bounds(buffer, start, end)
+    is_epoch = buffer[starts] == ord(">")
+    epoch_of_line = np.cumsum(is_epoch) - 1
+    epoch_starts = starts[is_epoch]
+    times, flags, _ = epoch_records(buffer, epoch_starts)
+
+    # Lines following an event epoch (flag > 1) are header records, not observations
+    observation = ~is_epoch & (epoch_of_line >= 0)
+    observation[observation] &= flags[epoch_of_line[observation]] <= 1
+    n_obs = max(len(codes) for codes in header.obs_types.values())
+    grid = line_grid(buffer, starts[observation], ends[observation], 3 + OBS_WIDTH * n_obs)
+    epoch_index = epoch_of_line[observation]
+
+    sv_codes = grid[:, :3].copy()
+    sv_codes[:, 1] = np.where(sv_codes[:, 1] == ord(" "), ord("0"), sv_codes[:, 1])  # "G 5" -> "G05"
+    sv_names = sv_codes.view("S3").ravel()
+    svs, sv_index = np.unique(sv_names, return_inverse=True)
+    systems = grid[:, 0]
+
+    shape = (len(times), len(svs))
+    data = {}
+    for system, codes in header.obs_types.items():
+        lines = np.flatnonzero(systems == ord(system))
+        if not len(lines):
+            continue
+        for k, code in enumerate(codes):
+            column = 3 + OBS_WIDTH * k
+            units, blank = fixed_decimal(grid[lines], column, VALUE_WIDTH, DECIMALS)
+            values = data.setdefault(code, np.full(shape, np.nan))
+            values[epoch_index[lines], sv_index[lines]] = np.where(blank, np.nan, units / 10**DECIMALS)
+            if indicators:
+                for suffix, offset in (("lli", VALUE_WIDTH), ("ssi", VALUE_WIDTH + 1)):
+                    flags_array = data.setdefault(f"{code}_{suffix}", np.full(shape, np.nan))
+                    chars = grid[lines, column + offset]
+                    flags_array[epoch_index[lines], sv_index[lines]] = np.where(
+                        chars == ord(" "), np.nan, chars.astype(np.float64) - ord("0"))
+
+    valid_epochs = flags <= 1
+    return times[valid_epochs], svs, {code: values[valid_epochs] for code, values in data.items()}
+
+
+def merge_records(header, blocks):
+    # decode_records results of consecutive blocks as one time x sv Dataset over the union of their satellites, one
+    # variable per observation code (and <code>_lli / <code>_ssi with indicators) in the header's order
+    times = np.concatenate([block_times for block_times, _, _ in blocks])
+    svs = np.unique(np.concatenate([block_svs for _, block_svs, _ in blocks]))
+    order = [name for codes in header.obs_types.values() for code in codes
+             for name in (code, f"{code}_lli", f"{code}_ssi")]
+    present = {code for _, _, block_data in blocks for code in block_data}
+    data = {code: np.full((len(times), len(svs)), np.nan) for code in dict.fromkeys(order) if code in present}
+    row = 0
+    for block_times, block_svs, block_data in blocks:
+        columns = np.searchsorted(svs, block_svs)
+        for code, values in block_data.items():
+            data[code][row:row + len(block_times), columns] = values
+        row += len(block_times)
+    ds = xr.Dataset({code: (("time", "sv"), values) for code, values in data.items()},
+                    coords={"time": times, "sv": svs.astype(str)})
+    ds.attrs.update(header.attrs, version=header.version)
+    return ds
+
+
+class ObsFile:
+    # Memory-mapped RINEX 3 observation file. The header is parsed and the epoch lines indexed on open; records are
+    # only decoded by read(), for the whole file or a time slice, so a 24-hour file can be read an hour at a time
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = np.frombuffer(self._mmap, dtype=np.uint8)
+        self.header = read_header(self._mmap)
+        self.offsets = epoch_lines(self.buffer, self.header.data_offset, len(self.buffer))
+        self.times = epoch_records(self.buffer, self.offsets)[0]
+
+    def read(self, start=None, end=None, indicators=False, block_epochs=EPOCH_BLOCK):
+        # Epochs with start <= time <= end (None for open ends), decoded `block_epochs` epochs at a time so the
+        # decoder's temporaries stay bounded whatever the length of the selection
+        first = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(pd.Timestamp(start)), "left"))
+        last = len(self.times) if end is None else int(
+            np.searchsorted(self.times, np.datetime64(pd.Timestamp(end)), "right"))
+        if first >= last:
+            return xr.Dataset(coords={"time": np.empty(0, "datetime64[ns]"), "sv": np.empty(0, str)},
+                              attrs=dict(self.header.attrs, version=self.header.version))
+        bounds = [int(self.offsets[i]) if i < len(self.offsets) else len(self.buffer)
+                  for i in list(range(first, last, block_epochs)) + [last]]
+        return merge_records(self.header, [decode_records(self.buffer, self.header, block_start, block_end, indicators)
+                                           for block_start, block_end in zip(bounds[:-1], bounds[1:])])
+
+    def close(self):
+        del self.buffer
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_obs(path, start=None, end=None, indicators=False):
+    with ObsFile(path) as obs:
+        return obs.read(start, end, indicators)
+
+
+def line_by_line(path):
+    # Baseline: a straightforward per-line parser into the same Dataset layout
+    with open(path) as f:
+        lines = f.read().splitlines()
+    body = next(i for i, line in enumerate(lines) if line[60:].strip() == "END OF HEADER") + 1
+    header = read_header(("\n".join(lines[:body]) + "\n").encode())
+    records, time_index = {}, -1
+    times = []
+    for line in lines[body:]:
+        if line.startswith(">"):
+            parts = line[1:].split()
+            times.append(pd.Timestamp(f"{parts[0]}-{parts[1]}-{parts[2]} {parts[3]}:{parts[4]}:{parts[5]}"))
+            time_index += 1
+            continue
+        sv = line[:3].replace(" ", "0")
+        for k, code in enumerate(header.obs_types[sv[0]]):
+            field = line[3 + OBS_WIDTH * k:3 + OBS_WIDTH * k + VALUE_WIDTH]
+            if field.strip():
+                records[(time_index, sv, code)] = float(field)
+    svs = sorted({sv for _, sv, _ in records})
+    data = {}
+    for (t, sv, code), value in records.items():
+        data.setdefault(code, np.full((len(times), len(svs)), np.nan))[t, svs.index(sv)] = value
+    return xr.Dataset({code: (("time", "sv"), values) for code, values in data.items()},
+                      coords={"time": times, "sv": svs})
+
+
+def benchmark(path, repeat=3):
+    import os
+    size_mb = os.path.getsize(path) / 2**20
+    print(f"RINEX 3 observation reading of {path} ({size_mb:.1f} MB)")
+    reference = None
+    for label, func in [("line by line", line_by_line), ("rinex_reader", read_obs)]:
+        timings = []
+        for _ in range(repeat if label == "rinex_reader" else 1):
+            t0 = time.perf_counter()
+            ds = func(path)
+            timings.append(time.perf_counter() - t0)
+        seconds = min(timings)
+        reference = ds if reference is None else reference
+        identical = np.array_equal(ds.time.values, reference.time.values) and all(
+            np.array_equal(ds[code].values, reference[code].values, equal_nan=True) for code in reference)
+        print(f"  {label:<14} {seconds * 1000:9.1f} ms  {size_mb / seconds:7.1f} MB/s  {ds.sizes['time']} epochs, "
+              f"{ds.sizes['sv']} satellites, identical: {identical}")
+
+    with ObsFile(path) as obs:
+        t0 = time.perf_counter()
+        middle = obs.times[len(obs.times) // 2]
+        ds = obs.read(middle, middle + np.timedelta64(60, "s"))
+        print(f"  {'one minute':<14} {(time.perf_counter() - t0) * 1000:9.1f} ms  {ds.sizes['time']} epochs")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Read a RINEX 3 observation file into an xarray Dataset")
+    parser.add_argument("obs", type=str, nargs="?", default="gnss/output/raw_output.obs", help="RINEX 3 OBS file")
+    parser.add_argument("--start", type=str, default=None, help="First epoch to read (GPS time)")
+    parser.add_argument("--end", type=str, default=None, help="Last epoch to read (GPS time)")
+    parser.add_argument("--benchmark", action="store_true", help="Compare with a line-by-line parser")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.obs)
+    else:
+        print(read_obs(args.obs, args.start, args.end))
@@ -0,0 +1,234 @@
+import glob
+import os
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from gnss.ubx_decoder import (CHUNK_BYTES, GPS_EPOCH, RAWX_HEADER, RAWX_MEAS, RXM_RAWX, SECONDS_PER_WEEK, SYNC,
+                              checksum, iter_frames)
+
+# Live RXM-RAWX monitoring: every epoch updates per-signal state held in preallocated arrays indexed by
+# (gnssId, svId, sigId), so the work per epoch is a few vectorized assignments whatever the constellation mix
+GNSS_IDS, SV_IDS, SIG_IDS = 8, 256, 8
+GNSS_LETTERS = np.array(list("GSECIJRN"))  # RINEX system letter by u-blox gnssId
+CNO_WINDOW = 10  # epochs of the rolling C/N0
+TRK_PHASE_VALID = 0x02
+POLL_SECONDS = 0.05
+
+
+class EpochSummary(NamedTuple):
+    time: np.datetime64
+    measurements: int
+    satellites: str  # count per system, e.g. "G9 E7 C5"
+    cno_mean: float
+    cno_min: int
+    slips: int
+    latency_ms: float  # from the arrival of the epoch's last byte to the summary
+
+
+class StreamMonitor:
+    # Rolling C/N0 (mean over the last CNO_WINDOW epochs a signal was tracked in), lock time and cycle slips per
+    # signal. A slip is flagged when the carrier phase is valid and the lock time restarted since the last
+    # observation of the signal: it went down, or is shorter than the time elapsed since
+    def __init__(self, window=CNO_WINDOW):
+        shape = (GNSS_IDS, SV_IDS, SIG_IDS)
+        self.window = window
+        self.cno_history = np.full((window,) + shape, np.nan, dtype=np.float32)
+        self.locktime_ms = np.zeros(shape, dtype=np.uint16)
+        self.last_seen = np.full(shape, -1, dtype=np.int64)  # ns since the GPS epoch, -1 before the first sight
+        self.slips = np.zeros(shape, dtype=np.uint32)
+        self.tracked = np.zeros(shape, dtype=bool)  # in the latest epoch
+        self.epochs = 0
+
+    def update(self, payload, received=None):
+        # One RXM-RAWX payload; returns the epoch summary
+        header = np.frombuffer(payload, dtype=RAWX_HEADER, count=1)[0]
+        n = min(int(header["num_meas"]), (len(payload) - RAWX_HEADER.itemsize) // RAWX_MEAS.itemsize)
+        meas = np.frombuffer(payload, dtype=RAWX_MEAS, count=n, offset=RAWX_HEADER.itemsize)
+        ns = int(header["week"]) * SECONDS_PER_WEEK * 10**9 + round(float(header["rcv_tow"]) * 1e9)
+        index = (np.minimum(meas["gnss_id"], GNSS_IDS - 1), meas["sv_id"], np.minimum(meas["sig_id"], SIG_IDS - 1))
+
+        locktime = meas["locktime"]
+        previous = self.last_seen[index]
+        elapsed_ms = (ns - previous) / 1e6
+        slip = ((previous >= 0) & (meas["trk_stat"] & TRK_PHASE_VALID > 0) &
+                ((locktime < self.locktime_ms[index]) | (locktime < elapsed_ms)))
+        self.slips[index] += slip
+        self.locktime_ms[index] = locktime
+        self.last_seen[index] = ns
+        self.tracked[:] = False
+        self.tracked[index] = True
+        row = self.cno_history[self.epochs % self.window]
+        row[:] = np.nan
+        row[index] = meas["cno"]
+        self.epochs += 1
+
+        svs = np.unique(index[0].astype(np.uint16) * SV_IDS + index[1])
+        systems, counts = np.unique(GNSS_LETTERS[svs // SV_IDS], return_counts=True)
+        return EpochSummary(
+            time=GPS_EPOCH + np.timedelta64(ns, "ns"),
+            measurements=n,
+            satellites=" ".join(f"{s}{c}" for s, c in zip(systems, counts)),
+            cno_mean=float(meas["cno"].mean()) if n else np.nan,
+            cno_min=int(meas["cno"].min()) if n else 0,
+            slips=int(slip.sum()),
+            latency_ms=(time.perf_counter() - received) * 1000 if received is not None else np.nan,
+        )
+
+    def signals(self):
+        # Signals of the latest epoch with their rolling C/N0, lock time and slip count
+        gnss_id, sv_id, sig_id = np.nonzero(self.tracked)
+        with np.errstate(invalid="ignore"):
+            history = self.cno_history[:, gnss_id, sv_id, sig_id]
+            cno = np.nanmean(history, axis=0) if len(gnss_id) else np.empty(0)
+        return pd.DataFrame({
+            "sv": [f"{letter}{sv:02d}" for letter, sv in zip(GNSS_LETTERS[gnss_id], sv_id)],
+            "sig_id": sig_id,
+            "cno_rolling": np.round(cno.astype(np.float64), 1),
+            "locktime_s": self.locktime_ms[gnss_id, sv_id, sig_id] / 1000,
+            "slips": self.slips[gnss_id, sv_id, sig_id],
+        })
+
+
+class ChunkStream:
+    # File-like view of a chunk iterator for iter_frames: read() returns the next chunk, whatever its size, so frames
+    # are decoded as soon as their bytes arrive. `received` is the arrival time of the latest chunk
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.received = None
+
+    def read(self, size=-1):
+        chunk = next(self._chunks, b"")
+        self.received = time.perf_counter()
+        return chunk
+
+
+def serial_chunks(port, baudrate=9600):
+    import serial
+    with serial.Serial(port, baudrate, timeout=POLL_SECONDS) as ser:
+        while True:
+            data = ser.read(ser.in_waiting or 1)
+            if data:
+                yield data
+
+
+def tail_chunks(pattern, poll_seconds=POLL_SECONDS):
+    # Follow the newest file matching `pattern` as it is written, then each later one in turn (the logger's next
+    # rotation, which starts on a frame). Files are ordered by name, which the logger stamps with the UTC time. The
+    # current file is only left once a later one exists and a read after seeing it returns nothing, so the bytes
+    # written to it up to the switch are all read
+    path = None
+    while path is None:
+        path = max(glob.glob(pattern), default=None)
+        time.sleep(0 if path else poll_seconds)
+    f = open(path, "rb")
+    f.seek(0, os.SEEK_END)  # only what is logged from now on
+    while True:
+        data = f.read(CHUNK_BYTES)
+        if data:
+            yield data
+            continue
+        later = sorted(candidate for candidate in glob.glob(pattern) if candidate > path)
+        if not later:
+            time.sleep(poll_seconds)
+            continue
+        data = f.read(CHUNK_BYTES)
+        while data:  # written between the empty read and the newer file showing up
+            yield data
+            data = f.read(CHUNK_BYTES)
+        f.close()
+        path, f = later[0], open(later[0], "rb")
+
+
+def frame_bytes(msg_class, msg_id, payload):
+    body = bytes([msg_class, msg_id]) + len(payload).to_bytes(2, "little") + bytes(payload)
+    return SYNC + body + bytes(checksum(body))
+
+
+def epoch_chunks(path):
+    # The frames of a log grouped into one chunk per RXM-RAWX epoch (with the frames preceding it) and the epochs'
+    # receiver times in seconds
+    chunks, times, pending = [], [], []
+    with open(path, "rb") as f:
+        for msg_class, msg_id, payload in iter_frames(f):
+            pending.append(frame_bytes(msg_class, msg_id, payload))
+            if (msg_class, msg_id) == RXM_RAWX:
+                header = np.frombuffer(payload, dtype=RAWX_HEADER, count=1)[0]
+                times.append(int(header["week"]) * SECONDS_PER_WEEK + float(header["rcv_tow"]))
+                chunks.append(b"".join(pending))
+                pending = []
+    return chunks, times
+
+
+def replay_chunks(chunks, times, speed=None):
+    # Epoch chunks released at their receiver time divided by `speed`, or all at once with speed=None
+    t0 = time.perf_counter()
+    for chunk, epoch in zip(chunks, times):
+        if speed:
+            delay = t0 + (epoch - times[0]) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield chunk
+
+
+def monitor(chunks, publish=print, state=None):
+    # Decode a UBX byte stream as it arrives and publish each RXM-RAWX epoch's summary; returns the monitor state
+    state = state or StreamMonitor()
+    stream = ChunkStream(chunks)
+    for msg_class, msg_id, payload in iter_frames(stream):
+        if (msg_class, msg_id) == RXM_RAWX and len(payload) >= RAWX_HEADER.itemsize:
+            publish(state.update(payload, stream.received))
+    return state
+
+
+def benchmark(path, speeds=(20, None)):
+    # Replay a log at `speed` times real time (None: as fast as it decodes) and report the epoch rate and latency
+    print(f"Live RXM-RAWX monitoring of {path} replayed")
+    for speed in speeds:
+        summaries = []
+        chunks, times = epoch_chunks(path)
+        t0 = time.perf_counter()
+        monitor(replay_chunks(chunks, times, speed), summaries.append)
+        seconds = time.perf_counter() - t0
+        latency = np.array([s.latency_ms for s in summaries])
+        label = f"{speed}x real time" if speed else "full speed"
+        print(f"  {label:<14} {len(summaries)} epochs in {seconds:6.2f} s ({len(summaries) / seconds:8.1f} epochs/s), "
+              f"latency p50 {np.percentile(latency, 50):.3f} ms, p99 {np.percentile(latency, 99):.3f} ms, "
+              f"max {latency.max():.3f} ms, {sum(s.slips for s in summaries)} slips")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Live per-epoch statistics of a u-blox RXM-RAWX stream")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--port", type=str, default=None, help="Serial port of the receiver")
+    source.add_argument("--tail", type=str, default=None,
+                        help="Follow the newest log matching this glob, quoted (e.g. \"gnss/output/logs/base_*.ubx\")")
+    source.add_argument("--replay", type=str, default="gnss/output/raw_output.ubx", help="Replay this UBX log")
+    parser.add_argument("--baudrate", type=int, default=9600, help="Serial baud rate")
+    parser.add_argument("--speed", type=float, default=1, help="Replay speed, times real time (0: full speed)")
+    parser.add_argument("--signals-every", type=int, default=0, help="Print the signal table every N epochs")
+    parser.add_argument("--benchmark", action="store_true", help="Replay the log at 20x real time and full speed")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.replay)
+    else:
+        chunks = (serial_chunks(args.port, args.baudrate) if args.port else
+                  tail_chunks(args.tail) if args.tail else
+                  replay_chunks(*epoch_chunks(args.replay), args.speed or None))
+        state = StreamMonitor()
+
+        def publish(summary):
+            print(f"{summary.time}  {summary.measurements:3d} meas  {summary.satellites:<24} C/N0 mean "
+                  f"{summary.cno_mean:4.1f} min {summary.cno_min:2d}  slips {summary.slips:2d}  "
+                  f"{summary.latency_ms:.2f} ms")
+            if args.signals_every and state.epochs % args.signals_every == 0:
+                print(state.signals().to_string(index=False))
+
+        try:
+            monitor(chunks, publish, state)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,181 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# UBX framing: sync chars, class, id, little-endian payload length, payload, 8-bit Fletcher checksum over class..payload
+SYNC = b"\xb5\x62"
+HEADER_BYTES = 6
+CHECKSUM_BYTES = 2
+MAX_PAYLOAD = 8192  # larger length fields are corrupt data, not frames
+RXM_RAWX = (0x02, 0x15)
+
+CHUNK_BYTES = 2**20
+BATCH_ROWS = 65536
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "ns")
+SECONDS_PER_WEEK = 604800
+
+# RXM-RAWX payload: a 16-byte epoch header, then numMeas 32-byte measurement blocks
+RAWX_HEADER = np.dtype([("rcv_tow", "<f8"), ("week", "<u2"), ("leap_s", "i1"), ("num_meas", "u1"),
+                        ("rec_stat", "u1"), ("version", "u1"), ("reserved", "V2")])
+RAWX_MEAS = np.dtype([("pseudorange", "<f8"), ("carrier_phase", "<f8"), ("doppler", "<f4"), ("gnss_id", "u1"),
+                      ("sv_id", "u1"), ("sig_id", "u1"), ("freq_id", "u1"), ("locktime", "<u2"), ("cno", "u1"),
+                      ("pr_stdev", "u1"), ("cp_stdev", "u1"), ("do_stdev", "u1"), ("trk_stat", "u1"),
+                      ("reserved", "V1")])
+RAWX_COLUMNS = {"epoch": "datetime64[ns]", "week": "u2", "rcv_tow": "f8", "gnss_id": "u1", "sv_id": "u1",
+                "sig_id": "u1", "pseudorange": "f8", "carrier_phase": "f8", "doppler": "f4", "cno": "u1",
+                "locktime": "u2", "trk_stat": "u1"}
+
+
+def checksum(frame):
+    # Fletcher-8 of class, id, length and payload: ck_a is the byte sum, ck_b the sum of the running ck_a values
+    data = np.frombuffer(frame, dtype=np.uint8)
+    weights = np.arange(len(data), 0, -1, dtype=np.uint32)
+    return int(data.sum(dtype=np.uint32)) & 0xFF, int(data.astype(np.uint32) @ weights) & 0xFF
+
+
+def iter_frames(stream, chunk_size=CHUNK_BYTES):
+    # (class, id, payload) of every valid UBX frame read from a binary stream, chunk by chunk with the partial frame
+    # at the end of a chunk carried over. Bytes between frames (NMEA, noise) and frames with a bad checksum are
+    # skipped by resynchronising on the next sync chars
+    buffer = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        buffer = buffer + chunk if buffer else chunk
+        view = memoryview(buffer)
+        position = 0
+        while True:
+            start = buffer.find(SYNC, position)
+            if start < 0:
+                position = len(buffer) - 1  # keep a trailing 0xB5 that may start the next chunk's frame
+                break
+            if start + HEADER_BYTES > len(buffer):
+                position = start
+                break
+            length = int.from_bytes(view[start + 4:start + 6], "little")
+            end = start + HEADER_BYTES + length + CHECKSUM_BYTES
+            if length > MAX_PAYLOAD:
+                position = start + 1
+                continue
+            if end > len(buffer):
+                position = start
+                break
+            if checksum(view[start + 2:end - 2]) != (buffer[end - 2], buffer[end - 1]):
+                position = start + 1
+                continue
+            yield buffer[start + 2], buffer[start + 3], view[start + HEADER_BYTES:end - CHECKSUM_BYTES]
+            position = end
+        buffer = buffer[max(position, 0):]
+
+
+def empty_batch(rows=BATCH_ROWS):
+    return {name: np.empty(rows, dtype=dtype) for name, dtype in RAWX_COLUMNS.items()}
+
+
+def iter_rawx_batches(stream, batch_rows=BATCH_ROWS, chunk_size=CHUNK_BYTES):
+    # RXM-RAWX measurements as dicts of column arrays of up to batch_rows rows, filled in place. Each epoch's
+    # measurement blocks are decoded at once through a structured dtype; memory stays at one chunk plus one batch
+    batch, rows = empty_batch(batch_rows), 0
+    for msg_class, msg_id, payload in iter_frames(stream, chunk_size):
+        if (msg_class, msg_id) != RXM_RAWX or len(payload) < RAWX_HEADER.itemsize:
+            continue
+        header = np.frombuffer(payload, dtype=RAWX_HEADER, count=1)[0]
+        n = min(int(header["num_meas"]), (len(payload) - RAWX_HEADER.itemsize) // RAWX_MEAS.itemsize)
+        meas = np.frombuffer(payload, dtype=RAWX_MEAS, count=n, offset=RAWX_HEADER.itemsize)
+        epoch = GPS_EPOCH + np.timedelta64(
+            int(header["week"]) * SECONDS_PER_WEEK * 10**9 + round(float(header["rcv_tow"]) * 1e9), "ns")
+
+        if rows + n > batch_rows:
+            yield {name: column[:rows] for name, column in batch.items()}
+            batch, rows = empty_batch(max(batch_rows, n)), 0
+        rows_slice = slice(rows, rows + n)
+        batch["epoch"][rows_slice] = epoch
+        batch["week"][rows_slice] = header["week"]
+        batch["rcv_tow"][rows_slice] = header["rcv_tow"]
+        for name in ("gnss_id", "sv_id", "sig_id", "pseudorange", "carrier_phase", "doppler", "cno", "locktime",
+                     "trk_stat"):
+            batch[name][rows_slice] = meas[name]
+        rows += n
+    if rows:
+        yield {name: column[:rows] for name, column in batch.items()}
+
+
+def decode_rawx(path, batch_rows=BATCH_ROWS):
+    # Whole log as one DataFrame, one row per measurement (epoch is GPS time)
+    with open(path, "rb") as f:
+        frames = [pd.DataFrame(batch) for batch in iter_rawx_batches(f, batch_rows)]
+    if not frames:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in RAWX_COLUMNS.items()})
+    return pd.concat(frames, ignore_index=True)
+
+
+def rawx_to_parquet(path, output, batch_rows=BATCH_ROWS):
+    # Stream a log of any length into a Parquet file, one row group per batch
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    with open(path, "rb") as f:
+        for batch in iter_rawx_batches(f, batch_rows):
+            table = pa.table(batch)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+def pyubx2_rawx(path):
+    # Baseline: message-by-message parsing with pyubx2, one dict per measurement
+    from pyubx2 import UBXReader
+
+    records = []
+    with open(path, "rb") as f:
+        for _, parsed in UBXReader(f):
+            if parsed is None or parsed.identity != "RXM-RAWX":
+                continue
+            for i in range(1, parsed.numMeas + 1):
+                suffix = f"_{i:02d}"
+                records.append({
+                    "rcv_tow": parsed.rcvTow, "week": parsed.week,
+                    "gnss_id": getattr(parsed, "gnssId" + suffix), "sv_id": getattr(parsed, "svId" + suffix),
+                    "pseudorange": getattr(parsed, "prMes" + suffix),
+                    "carrier_phase": getattr(parsed, "cpMes" + suffix),
+                    "doppler": getattr(parsed, "doMes" + suffix), "cno": getattr(parsed, "cno" + suffix),
+                })
+    return pd.DataFrame(records)
+
+
+def benchmark(path, repeat=3):
+    import os
+    size_mb = os.path.getsize(path) / 2**20
+    print(f"RXM-RAWX decoding of {path} ({size_mb:.1f} MB)")
+    for label, func in [("pyubx2", pyubx2_rawx), ("ubx_decoder", decode_rawx)]:
+        timings = []
+        for _ in range(repeat if label == "ubx_decoder" else 1):
+            t0 = time.perf_counter()
+            df = func(path)
+            timings.append(time.perf_counter() - t0)
+        seconds = min(timings)
+        print(f"  {label:<12} {seconds * 1000:9.1f} ms  {size_mb / seconds:7.1f} MB/s  {len(df)} measurements")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Decode the RXM-RAWX measurements of a UBX log")
+    parser.add_argument("log", type=str, nargs="?", default="gnss/output/raw_output.ubx", help="UBX log")
+    parser.add_argument("--parquet", type=str, default=None, help="Write the measurements to this Parquet file")
+    parser.add_argument("--benchmark", action="store_true", help="Compare the decoding speed with pyubx2")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.log)
+    elif args.parquet:
+        print(f"{rawx_to_parquet(args.log, args.parquet)} measurements written to {args.parquet}")
+    else:
+        print(decode_rawx(args.log))
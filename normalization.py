@@ -0,0 +1,168 @@
+from typing import NamedTuple
+import time
+import tracemalloc
+
+import numpy as np
+
+PERCENTILES = (2, 98)
+HISTOGRAM_BINS = 4096
+HISTOGRAM_CHUNK = 2**20
+SAMPLE_SIZE = 1_000_000
+SAMPLE_CONFIDENCE = 0.99
+
+
+class StretchLimits(NamedTuple):
+    # Percentile stretch limits and a bound on their error, in pixel value units (0 when exact)
+    low: float
+    high: float
+    error: float = 0.0
+
+
+def value_histogram(img, bins=HISTOGRAM_BINS, value_range=None):
+    # Counts and bin edges of the pixel values. Integer rasters (Sentinel-2 digital numbers) get one bin per value,
+    # so percentiles read from them are exact; float rasters get `bins` bins over `value_range` (default min-max)
+    values = img.ravel()
+    if np.issubdtype(img.dtype, np.integer):
+        low = int(values.min()) if value_range is None else int(value_range[0])
+        high = int(values.max()) if value_range is None else int(value_range[1])
+        counts = np.zeros(high - low + 1, dtype=np.int64)
+        for start in range(0, values.size, HISTOGRAM_CHUNK):  # bincount casts to intp, so a block at a time
+            counts += np.bincount(values[start:start + HISTOGRAM_CHUNK] - low, minlength=high - low + 1)
+        return counts, np.arange(low, high + 2)
+    if value_range is None:
+        value_range = (float(values.min()), float(values.max()))
+    return np.histogram(values, bins=bins, range=value_range)
+
+
+def histogram_limits(counts, edges, percentiles=PERCENTILES):
+    # Percentiles with the same linear interpolation as np.percentile. With one bin per integer value the order
+    # statistics are exact; otherwise each is placed uniformly inside its bin, within one bin width of the truth
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+    integer_bins = np.issubdtype(edges.dtype, np.integer)
+
+    def order_statistic(k):
+        b = np.searchsorted(cumulative, k, side="right")
+        if integer_bins:
+            return float(edges[b])
+        before = cumulative[b - 1] if b else 0
+        return edges[b] + (k - before + 0.5) / counts[b] * (edges[b + 1] - edges[b])
+
+    limits = []
+    for p in percentiles:
+        rank = p / 100 * (n - 1)
+        k = int(np.floor(rank))
+        lower = order_statistic(k)
+        upper = order_statistic(min(k + 1, n - 1))
+        limits.append(lower + (rank - k) * (upper - lower))
+    error = 0.0 if integer_bins else float(np.max(np.diff(edges)))
+    return StretchLimits(float(limits[0]), float(limits[1]), error)
+
+
+def sampled_limits(img, percentiles=PERCENTILES, sample_size=SAMPLE_SIZE, confidence=SAMPLE_CONFIDENCE, seed=0):
+    # Percentiles of a uniform random sample of pixels. By the Dvoretzky-Kiefer-Wolfowitz inequality the sample
+    # ranks are within eps = sqrt(ln(2 / (1 - confidence)) / (2 n)) of the true ones with that confidence; the error
+    # reported is how far the sample percentiles move over +-eps
+    values = img.ravel()
+    if values.size <= sample_size:
+        low, high = np.percentile(values, percentiles)
+        return StretchLimits(float(low), float(high))
+
+    sample = values[np.random.default_rng(seed).integers(0, values.size, sample_size)]
+    eps = 100 * np.sqrt(np.log(2 / (1 - confidence)) / (2 * sample_size))
+    bounds = [p for q in percentiles for p in (max(q - eps, 0), q, min(q + eps, 100))]
+    low_min, low, low_max, high_min, high, high_max = np.percentile(sample, bounds)
+    return StretchLimits(float(low), float(high), float(max(low_max - low_min, high_max - high_min)))
+
+
+def stretch_limits(img, percentiles=PERCENTILES, method="exact"):
+    # exact: np.percentile (sorts a full copy), histogram: value_histogram, sample: sampled_limits
+    if method == "histogram":
+        return histogram_limits(*value_histogram(img), percentiles)
+    if method == "sample":
+        return sampled_limits(img, percentiles)
+    low, high = np.percentile(img, percentiles)
+    return StretchLimits(float(low), float(high))
+
+
+def series_limits(images, percentiles=PERCENTILES, bins=HISTOGRAM_BINS, value_range=None):
+    # One set of limits for a whole scene or time series, from the pooled histograms of its rasters. Integer
+    # rasters are pooled exactly; float rasters need a shared `value_range` (default: min and max over the images)
+    images = list(images)
+    if np.issubdtype(images[0].dtype, np.integer) or value_range is None:
+        value_range = (min(img.min() for img in images), max(img.max() for img in images))
+    counts, edges = value_histogram(images[0], bins, value_range)
+    for img in images[1:]:
+        counts = counts + value_histogram(img, bins, value_range)[0]
+    return histogram_limits(counts, edges, percentiles)
+
+
+def normalize_image(img, limits=None, method="exact", inplace=False):
+    # Clip to the stretch limits and scale to [0, 1]. With inplace=True a float image is overwritten and no array is
+    # allocated; otherwise one float32 (or the input float dtype) array is. `limits` (low, high) can be reused from
+    # stretch_limits or series_limits so a scene or series is stretched consistently
+    low, high = (limits if limits is not None else stretch_limits(img, method=method))[:2]
+    if inplace:
+        if not np.issubdtype(img.dtype, np.floating):
+            raise ValueError(f"In-place normalization needs a float image, got {img.dtype}")
+        out = img
+    else:
+        out = np.empty(img.shape, dtype=img.dtype if np.issubdtype(img.dtype, np.floating) else np.float32)
+    np.clip(img, low, high, out=out, casting="unsafe")
+    out -= low
+    out /= high - low
+    return out
+
+
+def legacy_normalize_image(img):
+    # Previous denoising.normalize_image, for the benchmark
+    p2, p98 = np.percentile(img,  (2, 98))
+    img_stretched = np.clip(img, p2, p98)
+    return (img_stretched - p2) / (p98 - p2)
+
+
+def benchmark(size, repeat=1):
+    # Full-scene band: exact limits with float64 temporaries against the histogram/sampled estimators in place
+    band = np.random.default_rng(0).gamma(2.0, 600.0, (size, size)).astype(np.uint16)
+    print(f"normalization of a {size}x{size} uint16 band")
+
+    def legacy():
+        return legacy_normalize_image(band.astype(np.float32))
+
+    def estimator(method):
+        def run():
+            img = band.astype(np.float32)
+            return normalize_image(img, stretch_limits(band if method == "histogram" else img, method=method),
+                                   inplace=True)
+        return run
+
+    reference = np.percentile(band, PERCENTILES)
+    for label, func in [("np.percentile + copies", legacy), ("exact, in place", estimator("exact")),
+                        ("histogram, in place", estimator("histogram")), ("sample, in place", estimator("sample"))]:
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        print(f"  {label:<24} {min(timings) * 1000:9.1f} ms  {peak:8.1f} MB peak")
+
+    for method in ("histogram", "sample"):
+        limits = stretch_limits(band, method=method)
+        deviation = max(abs(limits.low - reference[0]), abs(limits.high - reference[1]))
+        print(f"  {method} limits ({limits.low:.1f}, {limits.high:.1f}), error bound {limits.error:.2f}, "
+              f"off by {deviation:.2f} from np.percentile")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark percentile normalization on a full-size band")
+    parser.add_argument("--size", type=int, default=10980, help="Side of the square test band in pixels")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per variant, the best one is reported")
+    args = parser.parse_args()
+
+    benchmark(args.size, args.repeat)
@@ -0,0 +1,387 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fnmatch import fnmatch
+import glob
+import hashlib
+import importlib
+import json
+import os
+import time
+from typing import NamedTuple
+
+ACQUISITION_DIR = "acquisition_forecaster/projects"
+COASTLINE_DIR = "coastline_estimator/projects"
+STATE_PATH = ".scheduler/state.json"
+TOOL_MODULES = {  # imported once before the pool starts, so the forked workers do not import them per task
+    "acquisition": ["acquisition_forecaster.plan_parser", "acquisition_forecaster.pass_forecaster"],
+    "coastline": ["coastline_estimator.shoreline"],
+}
+
+# Every project of both tools as one task graph, run on a bounded process pool. A task is skipped when the content
+# of its inputs (and its arguments) hashes to the key of its last successful run and its outputs are still there.
+# Inputs include the outputs of upstream tasks, so a rerun upstream that writes the same bytes stops there. File
+# digests are kept with the file size and mtime and only recomputed when these change, so checking an unchanged
+# tree costs a stat per file. Stages import the tools when they run, so building and checking the graph stays cheap
+
+
+class Task(NamedTuple):
+    name: str  # <tool>/<project>:<stage>[:<scene>]
+    func: object  # module-level function, run in a worker process as func(*args)
+    args: tuple
+    inputs: list
+    outputs: list
+    deps: tuple = ()
+
+
+class Result(NamedTuple):
+    status: str  # ran, skipped (up to date), failed, or blocked (a dependency failed)
+    seconds: float
+
+
+# Acquisition stages: parse plans -> filter -> (with the pass forecast) export, and the revisit plot
+
+def parse_plans_stage(kmls, output):
+    # The cached per-file tables (polygons as WKB) of plan_parser, concatenated
+    import pandas as pd
+    from acquisition_forecaster import plan_parser
+    df = pd.concat([plan_parser.load_plan_table(kml) for kml in kmls], ignore_index=True)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    df.to_parquet(output)
+
+
+def filter_plans_stage(config_path, plans_path, output):
+    import geopandas as gpd
+    import pandas as pd
+    import shapely
+    from shapely.geometry import Point
+    from acquisition_forecaster import plan_parser
+    with open(config_path) as f:
+        config = json.load(f)
+    df = pd.read_parquet(plans_path)
+    gdf = gpd.GeoDataFrame(df, geometry=shapely.from_wkb(df["polygon"].values), crs="EPSG:4326")
+    start_date = pd.to_datetime(config["START_DATE"])
+    end_date = pd.to_datetime(config["END_DATE"]) + pd.Timedelta(days=1)
+    plans = plan_parser.filter_plans(gdf, Point(config["POINT"]), start_date, end_date)
+    plans.drop(columns="polygon").to_csv(output, index=False)
+
+
+def forecast_stage(project, output):
+    from acquisition_forecaster import pass_forecaster
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    pass_forecaster.forecast_project_network(project).to_csv(output, index=False)
+
+
+def plot_stage(project, output):
+    import matplotlib
+    matplotlib.use("Agg")
+    from acquisition_forecaster import historical_analysis
+    historical_analysis.plot(project, output)
+
+
+def export_stage(plans_path, passes_path, output):
+    # Planned captures and passes of the project as one timeline
+    import pandas as pd
+    frames = []
+    if plans_path:
+        plans = pd.read_csv(plans_path)
+        frames.append(pd.DataFrame({"source": "plan", "satellite": plans["satellite"],
+                                    "start": plans["capture_start"], "end": plans["capture_end"],
+                                    "detail": plans["acquisition_type"]}))
+    if passes_path:
+        passes = pd.read_csv(passes_path)
+        frames.append(pd.DataFrame({"source": "pass", "satellite": passes["satellite"],
+                                    "start": passes["aos"], "end": passes["los"],
+                                    "detail": [f"{station}, max {elevation:.1f}°" for station, elevation in
+                                               zip(passes["station"], passes["max_elevation"])]}))
+    table = pd.concat(frames, ignore_index=True)
+    table["start"] = pd.to_datetime(table["start"], utc=True, format="ISO8601")
+    table["end"] = pd.to_datetime(table["end"], utc=True, format="ISO8601")
+    table.sort_values(["start", "source", "satellite"], ignore_index=True).to_csv(output, index=False)
+
+
+# Coastline stages, per scene: read and crop -> denoise -> coastline, then the project's shoreline series
+
+def crop_stage(green_path, nir_path, aoi_path, output):
+    import numpy as np
+    from coastline_estimator import shoreline
+    green, nir, transform, crs = shoreline.load_crop(green_path, nir_path, shoreline.load_aoi(aoi_path))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    shoreline.save_npz(output, green=green, nir=nir, transform=np.array(transform)[:6], crs=crs.to_wkt())
+
+
+def denoise_stage(crop_path, denoising_method, output):
+    import numpy as np
+    from coastline_estimator import shoreline
+    with np.load(crop_path) as crop:
+        index = shoreline.scene_index(crop["green"], crop["nir"], denoising_method)
+        shoreline.save_npz(output, ndwi=index, transform=crop["transform"], crs=crop["crs"])
+
+
+def coastline_stage(name, index_path, output):
+    # The shoreline table key of the scene is the digest of its NDWI
+    import numpy as np
+    import rasterio
+    from rasterio import Affine
+    from coastline_estimator import shoreline
+    with np.load(index_path) as cached:
+        index, transform = cached["ndwi"], Affine(*cached["transform"])
+        crs = rasterio.CRS.from_wkt(str(cached["crs"]))
+    threshold = shoreline.water_threshold(index)
+    line = shoreline.shoreline_geometry(index, threshold, transform)
+    _, gdf = shoreline.scene_shoreline(name, file_digest(index_path), index, threshold, line, crs)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    gdf.astype({"date": str}).to_file(output, driver="GeoJSON")
+
+
+def series_stage(aoi_path, shoreline_paths, output):
+    import geopandas as gpd
+    import pandas as pd
+    from coastline_estimator import shoreline, transects
+    gdf = pd.concat([gpd.read_file(path) for path in shoreline_paths], ignore_index=True)
+    table = pd.DataFrame(gdf.drop(columns="geometry"))[shoreline.SHORELINE_COLUMNS]
+    table["date"] = pd.to_datetime(table["date"])
+    shorelines = gpd.GeoDataFrame({"key": table["key"]}, geometry=gdf.geometry.values, crs="EPSG:4326")
+    transect_lines = transects.load_transects(f"{output}/transects.geojson", shoreline.load_aoi(aoi_path))
+    positions = transects.shoreline_positions(transect_lines, shorelines)
+    shoreline.write_series(output, table.sort_values(["date", "scene"], ignore_index=True), positions)
+
+
+# Task graph
+
+def acquisition_projects(projects_dir=ACQUISITION_DIR):
+    return sorted(path.split(os.sep)[-3] for path in glob.glob(f"{projects_dir}/*/input/config.json"))
+
+
+def coastline_projects(projects_dir=COASTLINE_DIR):
+    return sorted(path.split(os.sep)[-3] for path in glob.glob(f"{projects_dir}/*/input/polygon.geojson"))
+
+
+def acquisition_tasks(project, projects_dir=ACQUISITION_DIR):
+    # Plans and passes where the project has plan files or a TLE file, the plot where it has a history
+    root, name = f"{projects_dir}/{project}", f"acquisition/{project}"
+    config, output = f"{root}/input/config.json", f"{root}/output"
+    kmls = sorted(glob.glob(f"{root}/input/sentinel_plans/*.kml"))
+    tle, history = f"{root}/input/tle", f"{output}/sentinel2_acquisitions.pkl"
+    plans, matches, passes = f"{output}/plans.parquet", f"{output}/plans.csv", f"{output}/passes.csv"
+
+    tasks = []
+    if kmls:
+        tasks.append(Task(f"{name}:plans", parse_plans_stage, (kmls, plans), kmls, [plans]))
+        tasks.append(Task(f"{name}:filter", filter_plans_stage, (config, plans, matches), [config, plans], [matches],
+                          (f"{name}:plans",)))
+    if os.path.exists(tle):
+        tasks.append(Task(f"{name}:forecast", forecast_stage, (project, passes), [config, tle], [passes]))
+    if tasks:
+        sources = [task for task in tasks if task.name.endswith((":filter", ":forecast"))]
+        exported = (matches if kmls else None, passes if os.path.exists(tle) else None)
+        tasks.append(Task(f"{name}:export", export_stage, exported + (f"{output}/schedule.csv",),
+                          [task.outputs[0] for task in sources], [f"{output}/schedule.csv"],
+                          tuple(task.name for task in sources)))
+    if os.path.exists(history):
+        tasks.append(Task(f"{name}:plot", plot_stage, (project, f"{output}/revisit.png"), [history],
+                          [f"{output}/revisit.png"]))
+    return tasks
+
+
+def coastline_tasks(project, projects_dir=COASTLINE_DIR):
+    # The scenes are input/scenes/*_green.tif with their *_nir.tif, or the config's "SCENES" glob, filtered with
+    # the config's "DENOISING_METHOD" (default: none), as coastline_estimator.shoreline lists them
+    root, name = f"{projects_dir}/{project}", f"coastline/{project}"
+    config = {}
+    if os.path.exists(f"{root}/input/config.json"):
+        with open(f"{root}/input/config.json") as f:
+            config = json.load(f)
+    pattern = os.path.join(root, "input", config.get("SCENES", "scenes/*_green.tif"))
+    method = config.get("DENOISING_METHOD", "none")
+    aoi, output = f"{root}/input/polygon.geojson", f"{root}/output"
+
+    tasks, lines = [], []
+    for green in sorted(glob.glob(pattern)):
+        scene = os.path.basename(green).replace("_green", "").rsplit(".", 1)[0]
+        nir = green.replace("_green", "_nir")
+        crop, index = f"{output}/cache/{scene}_crop.npz", f"{output}/cache/{scene}_ndwi.npz"
+        line = f"{output}/shorelines/{scene}.geojson"
+        tasks += [
+            Task(f"{name}:crop:{scene}", crop_stage, (green, nir, aoi, crop), [green, nir, aoi], [crop]),
+            Task(f"{name}:denoise:{scene}", denoise_stage, (crop, method, index), [crop], [index],
+                 (f"{name}:crop:{scene}",)),
+            Task(f"{name}:coastline:{scene}", coastline_stage, (scene, index, line), [index], [line],
+                 (f"{name}:denoise:{scene}",)),
+        ]
+        lines.append(line)
+    if lines:
+        series = [f"{output}/{file}" for file in ("shorelines.csv", "transect_positions.csv", "transect_stats.csv")]
+        tasks.append(Task(f"{name}:series", series_stage, (aoi, lines, output), [aoi] + lines, series,
+                          tuple(task.name for task in tasks if ":coastline:" in task.name)))
+    return tasks
+
+
+def build_tasks(acquisition_dir=ACQUISITION_DIR, coastline_dir=COASTLINE_DIR):
+    tasks = []
+    for project in acquisition_projects(acquisition_dir):
+        tasks += acquisition_tasks(project, acquisition_dir)
+    for project in coastline_projects(coastline_dir):
+        tasks += coastline_tasks(project, coastline_dir)
+    return tasks
+
+
+def select(tasks, patterns):
+    # Tasks whose name matches one of the glob `patterns`, with everything they depend on
+    by_name = {task.name: task for task in tasks}
+    wanted = [task.name for task in tasks if any(fnmatch(task.name, pattern) for pattern in patterns)]
+    selected = set()
+    while wanted:
+        name = wanted.pop()
+        if name not in selected:
+            selected.add(name)
+            wanted += by_name[name].deps
+    return [task for task in tasks if task.name in selected]
+
+
+# Up-to-date checks and execution
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(path, digests):
+    # Digest of the file, reused from `digests` ({path: [size, mtime_ns, digest]}) while size and mtime match
+    stat = os.stat(path)
+    known = digests.get(path)
+    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return known[2]
+    digest = file_digest(path)
+    digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+
+def task_key(task, digests):
+    key = hashlib.sha256(f"{task.func.__name__}{task.args!r}".encode())
+    for path in task.inputs:
+        key.update(content_hash(path, digests).encode())
+    return key.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {"files": {}, "tasks": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def timed(func, args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+
+def run(tasks, workers=os.cpu_count(), force=False, state_path=STATE_PATH, log=print):
+    # Tasks are checked as soon as their dependencies are done, in the main process, and the stale ones submitted to
+    # a pool of `workers` processes, started (after importing the tools) only if something has to run. Returns
+    # {name: Result}; a failed task leaves its previous key unchanged and blocks its dependents
+    state = load_state(state_path)
+    by_name = {task.name: task for task in tasks}
+    pending = {task.name: set(task.deps) for task in tasks}
+    dependents = {task.name: [] for task in tasks}
+    for task in tasks:
+        for dep in task.deps:
+            dependents[dep].append(task.name)
+    ready = deque(name for name, deps in pending.items() if not deps)
+    tools = {task.name.split("/")[0] for task in tasks}
+    results, running, pool = {}, {}, None
+
+    def finish(name, result):
+        results[name] = result
+        if result.status != "skipped":
+            log(f"{result.status:<8} {result.seconds:8.2f} s  {name}")
+        for dependent in dependents[name]:
+            pending[dependent].discard(name)
+            if not pending[dependent]:
+                ready.append(dependent)
+
+    try:
+        while ready or running:
+            while ready:
+                task = by_name[ready.popleft()]
+                if any(results[dep].status in ("failed", "blocked") for dep in task.deps):
+                    finish(task.name, Result("blocked", 0.0))
+                    continue
+                try:
+                    key = task_key(task, state["files"])
+                except FileNotFoundError as e:
+                    log(f"{task.name}: missing input {e.filename}")
+                    finish(task.name, Result("failed", 0.0))
+                    continue
+                if not force and state["tasks"].get(task.name) == key and all(map(os.path.exists, task.outputs)):
+                    finish(task.name, Result("skipped", 0.0))
+                    continue
+                if pool is None:
+                    for module in {module for tool in tools for module in TOOL_MODULES.get(tool, [])}:
+                        importlib.import_module(module)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                running[pool.submit(timed, task.func, task.args)] = (task.name, key)
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        log(f"{name}: {type(e).__name__}: {e}")
+                        finish(name, Result("failed", 0.0))
+                    else:
+                        state["tasks"][name] = key
+                        finish(name, Result("ran", seconds))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        save_state(state, state_path)
+    return results
+
+
+def main(patterns=None, workers=os.cpu_count(), force=False, state_path=STATE_PATH):
+    t0 = time.perf_counter()
+    tasks = build_tasks()
+    if patterns:
+        tasks = select(tasks, patterns)
+    results = run(tasks, workers, force, state_path)
+    counts = {status: sum(result.status == status for result in results.values())
+              for status in ("ran", "skipped", "failed", "blocked")}
+    busy = sum(result.seconds for result in results.values())
+    print(f"{len(tasks)} tasks: {counts['ran']} ran ({busy:.2f} s of task time), {counts['skipped']} up to date, "
+          f"{counts['failed']} failed, {counts['blocked']} blocked in {time.perf_counter() - t0:.3f} s")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Bring the outputs of every acquisition and coastline project up to"
+                                                 " date, running only the stages whose inputs changed")
+    parser.add_argument("--only", type=str, nargs="+", default=None,
+                        help="Task name globs, quoted (e.g. \"coastline/*\"), run with their dependencies")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes running tasks")
+    parser.add_argument("--force", action="store_true", help="Run every task, up to date or not")
+    parser.add_argument("--list", action="store_true", help="Print the task graph instead of running it")
+    args = parser.parse_args()
+
+    if args.list:
+        tasks = build_tasks()
+        for task in select(tasks, args.only) if args.only else tasks:
+            print(f"{task.name}  <- {', '.join(task.deps) if len(task.deps) <= 2 else f'{len(task.deps)} tasks'}")
+    else:
+        results = main(args.only, args.workers, args.force)
+        sys.exit(1 if any(result.status in ("failed", "blocked") for result in results.values()) else 0)
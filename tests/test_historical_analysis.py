@@ -0,0 +1,42 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from shapely.geometry import Point
+
+from acquisition_forecaster import acquisition_store, historical_analysis
+
+
+class FailingCatalog:
+    # Stand-in for a STAC client whose queries fail for the date ranges in `failing` (all of them by default)
+    def __init__(self, failing=None):
+        self.failing = failing
+
+    def search(self, datetime, **kwargs):
+        if self.failing is None or datetime in self.failing:
+            raise ConnectionError("catalogue unreachable")
+        day = date.fromisoformat(datetime.split("/")[0])
+        item = SimpleNamespace(id=f"S2A_{day:%Y%m%d}", datetime=datetime_at(day))
+        return SimpleNamespace(items=lambda: [item])
+
+
+def datetime_at(day):
+    return datetime(day.year, day.month, day.day, 10, 50, tzinfo=timezone.utc)
+
+
+def fetch(store, catalog, monkeypatch, end_date=datetime(2024, 3, 1)):
+    monkeypatch.setattr(historical_analysis.time, "sleep", lambda seconds: None)  # no retry backoff
+    return historical_analysis.fetch_incremental(str(store), catalog, Point(1.98, 41.27),
+                                                 datetime(2024, 1, 1), end_date, workers=1)
+
+
+def test_failed_queries_leave_no_coverage(tmp_path, monkeypatch):
+    records = fetch(tmp_path, FailingCatalog(), monkeypatch)
+    assert records.empty
+    assert acquisition_store.load_coverage(str(tmp_path)) == []
+
+
+def test_coverage_skips_the_failed_chunk(tmp_path, monkeypatch):
+    # Three-month chunks: 2024-01-01/2024-04-01 is queried, 2024-04-01/2024-06-30 fails
+    records = fetch(tmp_path, FailingCatalog(failing={"2024-04-01/2024-06-30"}), monkeypatch, datetime(2024, 6, 30))
+    assert list(records["id"]) == ["S2A_20240101"]
+    assert acquisition_store.load_coverage(str(tmp_path)) == [(date(2024, 1, 1), date(2024, 4, 2))]
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pytest
+
+from gnss import rinex_reader
+
+OBS = os.path.join(os.path.dirname(__file__), "..", "gnss", "output", "raw_output.obs")
+
+
+@pytest.fixture
+def small_obs(tmp_path):
+    # Header and first 40 epochs of the recorded observation file
+    with open(OBS, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    epochs = [i for i, line in enumerate(lines) if line.startswith(b">")]
+    path = tmp_path / "small.obs"
+    path.write_bytes(b"".join(lines[:epochs[40]]))
+    return str(path)
+
+
+def assert_same(ds, reference):
+    assert np.array_equal(ds.time.values, reference.time.values)
+    assert list(ds.sv.values) == list(reference.sv.values)
+    assert set(ds.data_vars) == set(reference.data_vars)
+    for code in reference.data_vars:
+        assert np.array_equal(ds[code].values, reference[code].values, equal_nan=True), code
+
+
+def test_read_obs_matches_line_by_line(small_obs):
+    ds = rinex_reader.read_obs(small_obs)
+    assert ds.sizes["time"] == 40
+    assert_same(ds, rinex_reader.line_by_line(small_obs))
+
+
+def test_read_in_blocks_and_slices(small_obs):
+    with rinex_reader.ObsFile(small_obs) as obs:
+        whole = obs.read()
+        assert_same(obs.read(block_epochs=3), whole)
+        start, end = obs.times[10], obs.times[19]
+        assert_same(obs.read(start, end, block_epochs=4), whole.sel(time=slice(start, end)).dropna("sv", how="all"))
+        assert obs.read(obs.times[-1] + np.timedelta64(1, "s")).sizes["time"] == 0
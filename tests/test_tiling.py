@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from scipy.ndimage import uniform_filter
+from skimage.restoration import denoise_bilateral
+
+import tiling
+
+
+def whole_image(image, method):
+    # The filters of denoising.py applied to the whole array at once
+    if method == "boxcar_4x4":
+        return uniform_filter(image, size=4, mode="reflect")
+    return denoise_bilateral(image, sigma_color=0.1, sigma_spatial=2, channel_axis=None)
+
+
+@pytest.mark.parametrize("method", ["boxcar_4x4", "bilateral"])
+@pytest.mark.parametrize("low, high", [(0.2, 3), (-3, -0.5), (-1, 1)])
+def test_tiled_equals_whole_image(method, low, high):
+    # Value ranges away from 0 are where a tile on its own would get a different bilateral colour table
+    image = np.random.default_rng(0).uniform(low, high, (70, 90)).astype(np.float32)
+    tiled = tiling.denoise(image, method, tile_size=32)
+    assert np.array_equal(tiled, whole_image(image, method))
+
+
+def test_tile_edges_one_pixel_wide():
+    # 65 columns leave a last column of tiles one pixel wide
+    image = np.random.default_rng(1).uniform(0.2, 3, (40, 65)).astype(np.float32)
+    assert np.array_equal(tiling.denoise(image, "bilateral", tile_size=32), whole_image(image, "bilateral"))
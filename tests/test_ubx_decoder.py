@@ -0,0 +1,52 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+from gnss import ubx_decoder
+
+LOG = os.path.join(os.path.dirname(__file__), "..", "gnss", "output", "raw_output.ubx")
+
+
+def frame(msg_class, msg_id, payload):
+    body = bytes([msg_class, msg_id]) + len(payload).to_bytes(2, "little") + payload
+    return ubx_decoder.SYNC + body + bytes(ubx_decoder.checksum(body))
+
+
+@pytest.fixture
+def small_log(tmp_path):
+    # The start of the recorded log (UBX frames between NMEA sentences), cut before a sentence so no frame is split
+    with open(LOG, "rb") as f:
+        data = f.read(2**17)
+    path = tmp_path / "small.ubx"
+    path.write_bytes(data[:data.index(b"\r\n$", 60000) + 2])
+    return str(path)
+
+
+def test_decode_rawx_matches_pyubx2(small_log):
+    pytest.importorskip("pyubx2")
+    decoded, reference = ubx_decoder.decode_rawx(small_log), ubx_decoder.pyubx2_rawx(small_log)
+    assert len(decoded) == len(reference) > 0
+    for name in reference.columns:
+        assert np.array_equal(decoded[name].to_numpy(reference[name].dtype), reference[name].to_numpy()), name
+
+
+def test_decode_rawx_batches(small_log):
+    # Batches smaller than an epoch's measurements, and chunks splitting every frame
+    whole = ubx_decoder.decode_rawx(small_log)
+    with open(small_log, "rb") as f:
+        batches = list(ubx_decoder.iter_rawx_batches(f, batch_rows=7, chunk_size=100))
+    assert sum(len(batch["epoch"]) for batch in batches) == len(whole)
+    assert np.array_equal(np.concatenate([batch["pseudorange"] for batch in batches]), whole["pseudorange"])
+
+
+def test_iter_frames_skips_bad_checksum_and_noise():
+    good, other = frame(0x02, 0x15, bytes(range(20))), frame(0x01, 0x07, b"\xb5\x62abc")
+    bad = bytearray(frame(0x02, 0x15, bytes(20)))
+    bad[-1] ^= 0xFF
+    stream = b"$GNGGA,noise*00\r\n" + good + bytes(bad) + b"\xb5" + other + b"\xb5\x62\x02"
+    for chunk_size in (1, 7, len(stream)):
+        frames = [(msg_class, msg_id, bytes(payload))
+                  for msg_class, msg_id, payload in ubx_decoder.iter_frames(io.BytesIO(stream), chunk_size)]
+        assert frames == [(0x02, 0x15, bytes(range(20))), (0x01, 0x07, b"\xb5\x62abc")]
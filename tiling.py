@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from math import ceil
+import time
+
+import numpy as np
+from scipy.ndimage import uniform_filter
+from skimage.restoration import denoise_bilateral
+
+TILE_SIZE = 1024
+
+# Neighbourhood filters applied tile by tile: each tile is read with a halo at least as wide as the filter reach,
+# filtered on its own and only its core is written back, so the stitched result equals filtering the whole array
+
+
+def boxcar(image, size=4):
+    return uniform_filter(image, size=size, mode="reflect")
+
+
+def boxcar_halo(size=4):
+    return size // 2
+
+
+def bilateral(image, value_range, radius, sigma_color=0.1, sigma_spatial=2):
+    # denoise_bilateral scales its colour lookup table with the image maximum (and shifts negative images by their
+    # minimum), so a tile on its own would be filtered with a different table than the whole array. Below the tile
+    # go `radius` rows of what the filter pads past the array edge (zero, after that shift), then two rows holding
+    # the whole array's min and max: they set the same table and are out of reach of every row of the tile
+    rows, cols = image.shape
+    padded = np.full((rows + radius + 2, cols), min(value_range[0], 0), dtype=image.dtype)
+    padded[:rows] = image
+    padded[-2:, 0] = value_range
+    filtered = denoise_bilateral(padded, win_size=2 * radius + 1, sigma_color=sigma_color,
+                                 sigma_spatial=sigma_spatial, channel_axis=None)
+    return filtered.reshape(padded.shape)[:rows]  # squeezed by denoise_bilateral when one pixel wide
+
+
+def bilateral_halo(sigma_spatial=2):
+    # Same default window as denoise_bilateral
+    return max(5, 2 * int(ceil(3 * sigma_spatial)) + 1) // 2
+
+
+def tile_windows(shape, tile_size, halo):
+    # (core, padded, core within padded) slice pairs covering `shape`, halos clipped at the array edges
+    rows, cols = shape
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            row_end, col_end = min(row + tile_size, rows), min(col + tile_size, cols)
+            top, left = max(row - halo, 0), max(col - halo, 0)
+            bottom, right = min(row_end + halo, rows), min(col_end + halo, cols)
+            yield ((slice(row, row_end), slice(col, col_end)),
+                   (slice(top, bottom), slice(left, right)),
+                   (slice(row - top, row_end - top), slice(col - left, col_end - left)))
+
+
+def filter_tiled(image, kernel, halo, tile_size=TILE_SIZE, workers=1, threads=False):
+    # Apply `kernel` (a picklable function of one 2-D array) tile by tile. Use threads=True for kernels that
+    # release the GIL (scipy.ndimage), a process pool otherwise
+    windows = list(tile_windows(image.shape, tile_size, halo))
+    tiles = (image[padded] for _, padded, _ in windows)
+    if workers <= 1:
+        return stitch(image.shape, windows, map(kernel, tiles))
+    with (ThreadPoolExecutor if threads else ProcessPoolExecutor)(workers) as pool:
+        return stitch(image.shape, windows, pool.map(kernel, tiles))
+
+
+def stitch(shape, windows, results):
+    out = None
+    for (core, _, inner), filtered in zip(windows, results):
+        if out is None:
+            out = np.empty(shape, dtype=filtered.dtype)
+        out[core] = filtered[inner]
+    return out
+
+
+def denoise(image, method, tile_size=TILE_SIZE, workers=1):
+    # Tiled equivalent of the denoising.py filters
+    if method == "boxcar_4x4":
+        return filter_tiled(image, boxcar, boxcar_halo(), tile_size, workers, threads=True)
+    if method == "bilateral":
+        radius = bilateral_halo()
+        kernel = partial(bilateral, value_range=(image.min(), image.max()), radius=radius)
+        return filter_tiled(image, kernel, radius, tile_size, workers)
+    return image
+
+
+def benchmark(size, method, tile_size, max_workers, repeat=1):
+    # Scaling across pool sizes on a random normalised image, checked against the untiled filter
+    image = np.random.default_rng(0).random((size, size), dtype=np.float32)
+    if method == "boxcar_4x4":
+        reference = uniform_filter(image, size=4, mode="reflect")
+    else:
+        reference = denoise_bilateral(image, sigma_color=0.1, sigma_spatial=2, channel_axis=None)
+
+    print(f"{method} on {size}x{size}, {tile_size}px tiles")
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            filtered = denoise(image, method, tile_size, workers)
+            timings.append(time.perf_counter() - t0)
+        seconds = min(timings)
+        baseline = baseline or seconds
+        identical = np.array_equal(filtered, reference)
+        print(f"  {workers:>3} worker(s) {seconds * 1000:9.1f} ms  x{baseline / seconds:.1f}  identical: {identical}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Benchmark the tiled denoising filters across cores")
+    parser.add_argument("--size", type=int, default=4096, help="Side of the square test image in pixels")
+    parser.add_argument("--method", type=str, choices=["boxcar_4x4", "bilateral"], default="bilateral")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="Tile side in pixels")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="Largest pool size")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per pool size, the best one is reported")
+    args = parser.parse_args()
+
+    benchmark(args.size, args.method, args.tile_size, args.max_workers, args.repeat)
@@ -1,28 +1,92 @@
 import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window
 import matplotlib.pyplot as plt
 import sys
+import math
 import numpy as np
 
+from normalization import stretch_limits
+
+DISPLAY_PIXELS = 2048  # longest side of what is read for display; zooming in reads the visible window at this size
+OVERVIEW_FACTORS = [2, 4, 8, 16, 32]
+
+
+def build_overviews(tif_path, factors=OVERVIEW_FACTORS):
+    # Store a decimated pyramid in the file so the viewer's reduced reads do not decode the full resolution
+    with rasterio.open(tif_path, "r+") as dst:
+        dst.build_overviews(factors, Resampling.average)
+
+
+def read_decimated(src, window, max_pixels=DISPLAY_PIXELS):
+    # `window` of band 1 averaged down to at most max_pixels on its longest side (served from overviews when present)
+    factor = max(1, math.ceil(max(window.width, window.height) / max_pixels))
+    out_shape = (max(1, math.ceil(window.height / factor)), max(1, math.ceil(window.width / factor)))
+    return src.read(1, window=window, out_shape=out_shape, resampling=Resampling.average)
+
+
+def read_neighbourhood(src, x_pix, y_pix, radius=1):
+    # Full-resolution pixel value and the mean of the (2 radius + 1)^2 window around it, clipped at the edges
+    window = Window(x_pix - radius, y_pix - radius, 2 * radius + 1, 2 * radius + 1).intersection(
+        Window(0, 0, src.width, src.height))
+    block = src.read(1, window=window)
+    return block[y_pix - int(window.row_off), x_pix - int(window.col_off)], np.mean(block)
+
+
+def display_limits(img, nodata=None):
+    # 2-98 percentile stretch of the valid pixels: NaN, infinities and the band's nodata value are left out
+    valid = np.isfinite(img) if np.issubdtype(img.dtype, np.floating) else np.ones(img.shape, dtype=bool)
+    if nodata is not None:
+        valid &= img != nodata
+    if not valid.any():
+        return None, None
+    return stretch_limits(img[valid], method="histogram")[:2]
+
+
 def show_geotiff(tif_path, downsample_normalize=True, title=""):
+    # With downsample_normalize the band is shown from a decimated read stretched to its 2-98 percentiles, the
+    # visible window is read again at screen resolution on zoom and clicks are answered by windowed reads, so a
+    # full tile opens without loading it. Otherwise the full band is read and shown as is
     with rasterio.open(tif_path) as src:
-        img = src.read(1)
         transform = src.transform
+        full = Window(0, 0, src.width, src.height)
 
         fig, ax = plt.subplots()
-        im = ax.imshow(img, cmap='gray')
+        if downsample_normalize:
+            img = read_decimated(src, full)
+            low, high = display_limits(img, src.nodata)
+            im = ax.imshow(img, cmap='gray', extent=(0, src.width, src.height, 0), vmin=low, vmax=high)
+        else:
+            img = src.read(1)
+            im = ax.imshow(img, cmap='gray')
         plt.colorbar(im)
         plt.title(title)
 
         clicked_coords = []
+        shown = [full]
 
-        def onclick(event):
-            if event.inaxes != ax:
+        def onzoom(event):
+            # Axes limits are in full-resolution pixels; read what is visible at display resolution. Run on draw
+            # rather than on xlim/ylim changes, which a zoom or pan fires one after the other: one read per view
+            (x0, x1), (y1, y0) = ax.get_xlim(), ax.get_ylim()
+            window = Window.from_slices((max(0, math.floor(y0)), min(src.height, math.ceil(y1))),
+                                        (max(0, math.floor(x0)), min(src.width, math.ceil(x1))))
+            if window == shown[0] or window.width < 1 or window.height < 1:
                 return
-            x_pix, y_pix = int(event.xdata), int(event.ydata)
-            val = img[y_pix, x_pix]
+            shown[0] = window
+            im.set_data(read_decimated(src, window))
+            im.set_extent((window.col_off, window.col_off + window.width,
+                           window.row_off + window.height, window.row_off))
+            fig.canvas.draw_idle()
 
-            # Average value in the 8 pixels around it
-            avg_val = np.mean(img[max(0, y_pix-1):y_pix+2, max(0, x_pix-1):x_pix+2])
+        if downsample_normalize:
+            fig.canvas.mpl_connect('draw_event', onzoom)
+
+        def onclick(event):
+            if event.inaxes != ax or getattr(fig.canvas.toolbar, "mode", ""):
+                return  # ignore the clicks of the zoom and pan tools
+            x_pix, y_pix = int(event.xdata), int(event.ydata)
+            val, avg_val = read_neighbourhood(src, x_pix, y_pix)
 
             lon, lat = rasterio.transform.xy(transform, y_pix, x_pix)
             print(f"Clicked pixel: ({x_pix}, {y_pix})")
@@ -41,10 +105,12 @@ def show_geotiff(tif_path, downsample_normalize=True, title=""):
             return None
 
 
-
 if __name__ == "__main__":
-    """ 
-        Usage: python utils.py <path_to_geotiff>. 
+    """
+        Usage: python utils.py <path_to_geotiff> [--build-overviews].
         E.g python utils.py S2B_MSIL2A_20250107T051119_N0511_R019_T43QHU_20250107T080132_green.tif
+        --build-overviews writes an overview pyramid into the file first, for faster opening of full tiles
     """
+    if "--build-overviews" in sys.argv[2:]:
+        build_overviews(sys.argv[1])
     show_geotiff(sys.argv[1])